@@ -0,0 +1,248 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Regeneration of the pre-generated sitemaps of every Plone site of a Zope
+instance, by the sitemap-regenerate-all console script::
+
+    bin/sitemap-regenerate-all -C parts/instance/etc/zope.conf -j 4 -t 300 --urls urls.txt
+
+Stored sitemaps keep the urls they were generated with: the --urls file gives
+the public url of each site, sites missing from it are reported and skipped.
+
+Sites are regenerated by a pool of worker processes (-j), each with its own
+ZODB connection, one site at a time. A site taking more than its time budget
+(-t seconds) stops after the sitemap being written: the rest is left for the
+next run. Sitemap views whose last run was complete and whose catalog counter
+didn't change since are skipped. A summary of the run is printed at the end and may be written
+as json too (--report).
+"""
+
+import sys
+import time
+import traceback
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import transaction
+from Acquisition import aq_base
+
+from Products.CMFCore.utils import getToolByName
+
+from googlesitemap.common import config
+from googlesitemap.common import invalidation
+from googlesitemap.common import storage
+from googlesitemap.common.regenerate import OutOfTime
+from googlesitemap.common.regenerate import regenerate
+from googlesitemap.common.regenerate import _initworker
+from googlesitemap.common.regenerate import _opensite
+
+
+def plonesites(container):
+    """ Paths of the Plone sites in container and in its folders """
+    from Products.CMFPlone.interfaces import IPloneSiteRoot
+    paths = []
+    for item in container.objectValues():
+        if IPloneSiteRoot.providedBy(item):
+            paths.append('/'.join(item.getPhysicalPath()))
+        elif getattr(aq_base(item), 'meta_type', None) == 'Folder':
+            paths.extend(plonesites(item))
+    return paths
+
+
+def catalogcounter(site):
+    """ The counter of the changes of the catalog of site. Catalogs without
+        it give the serial of the last change logged for sitemaps.
+    """
+    catalog = getToolByName(site, 'portal_catalog')
+    if getattr(aq_base(catalog), 'getCounter', None) is None:
+        return invalidation.token(site)
+    return catalog.getCounter()
+
+
+def _unchanged(state, counter):
+    """ True if the last run of a sitemap view was complete at counter """
+    return bool(state and state.get('complete') and state.get('counter') == counter)
+
+
+def regeneratesite(site, names, force=False, budget=None):
+    """ Regenerates the stale sitemaps of the views called names, skipping the
+        views whose catalog didn't change since their last complete run.
+        Returns the status of the site and the names of the regenerated sitemaps.
+    """
+    store = storage.getStore(site)
+    if store is None:
+        raise ValueError('No sitemaps directory configured')
+    counter = catalogcounter(site)
+    # view name -> {'counter', 'complete', 'time'} of its last run
+    state = store.state()
+    names = [name for name in names if force or not _unchanged(state.get(name), counter)]
+    if not names:
+        return 'skipped', []
+
+    deadline = None
+    if budget:
+        deadline = time.time() + budget
+    status = 'ok'
+    regenerated = []
+    for name in names:
+        try:
+            regenerated.extend(regenerate(site, name, force, deadline=deadline))
+        except OutOfTime, e:
+            regenerated.extend(e.regenerated)
+            state[name] = {'counter': counter, 'complete': False, 'time': time.time()}
+            status = 'timeout'
+            break
+        state[name] = {'counter': counter, 'complete': True, 'time': time.time()}
+    store.setstate(state)
+    return status, regenerated
+
+
+def _regeneratesite(args):
+    """ Regenerates a site with a ZODB connection of its own, returns its report """
+    path, url, names, force, budget = args
+    started = time.time()
+    report = {'site': path, 'sitemaps': [], 'error': None}
+    try:
+        app, site = _opensite(path, url)
+        try:
+            report['status'], report['sitemaps'] = regeneratesite(site, names, force, budget)
+        finally:
+            transaction.abort()
+            app._p_jar.close()
+    except Exception:
+        report['status'] = 'error'
+        report['error'] = traceback.format_exc()
+    report['seconds'] = round(time.time() - started, 3)
+    return report
+
+
+def _tasks(paths, urls, names, force, budget):
+    """ The arguments of _regeneratesite for the sites with a public url, and
+        the reports of the sites without
+    """
+    tasks = []
+    skipped = []
+    for path in paths:
+        url = urls.get(path)
+        if url:
+            tasks.append((path, url, names, force, budget))
+        else:
+            skipped.append({'site': path, 'status': 'nourl', 'sitemaps': [], 'seconds': 0.0,
+                            'error': 'No public url for %s in the --urls file' % path})
+    return tasks, skipped
+
+
+def summary(reports):
+    """ The summary of a run, a line for each site and the totals """
+    lines = []
+    totals = {}
+    for report in reports:
+        lines.append('%-8s %6d sitemaps %9.1fs  %s' % (report['status'], len(report['sitemaps']),
+                                                      report['seconds'], report['site']))
+        totals[report['status']] = totals.get(report['status'], 0) + 1
+    lines.append('%d sites: %s, %d sitemaps, %.1fs' % (
+        len(reports),
+        ', '.join(['%d %s' % (totals[status], status) for status in sorted(totals)]),
+        sum([len(report['sitemaps']) for report in reports]),
+        sum([report['seconds'] for report in reports])))
+    return '\n'.join(lines)
+
+
+def _readurls(filename):
+    """ site path -> public url, from a file with a site path and its url per line """
+    urls = {}
+    fp = open(filename)
+    try:
+        for line in fp:
+            parts = line.split()
+            if len(parts) == 2:
+                urls[parts[0]] = parts[1]
+    finally:
+        fp.close()
+    return urls
+
+
+def main(args=None):
+    """ The sitemap-regenerate-all console script """
+    parser = OptionParser(usage='%prog -C zope.conf [options] [site_path...]')
+    parser.add_option('-C', '--config', dest='config',
+                      help='the zope.conf of the instance')
+    parser.add_option('-n', '--name', dest='names', action='append',
+                      help='sitemap view to regenerate, may be repeated (default %s)' %
+                           ', '.join(config.SITEMAPS))
+    parser.add_option('--urls', dest='urls',
+                      help='file with a site path and its public url on each line, required')
+    parser.add_option('-f', '--force', dest='force', action='store_true', default=False,
+                      help='regenerate also sites and sitemaps not changed')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1,
+                      help='worker processes, each regenerating a site at a time (default 1)')
+    parser.add_option('-t', '--time-budget', dest='budget', type='float', default=None,
+                      help='seconds a site may take, the rest is left for the next run')
+    parser.add_option('--report', dest='report',
+                      help='write the report of the run to this file, as json')
+    options, paths = parser.parse_args(args)
+    if not options.config or not options.urls:
+        parser.error('zope.conf and the --urls file are required')
+
+    pool = None
+    if options.jobs > 1:
+        # before opening the database
+        from multiprocessing import Pool
+        pool = Pool(options.jobs, _initworker, (options.config,))
+
+    import Zope2
+    Zope2.configure(options.config)
+    urls = _readurls(options.urls)
+    if not paths:
+        app = Zope2.app()
+        try:
+            paths = plonesites(app)
+        finally:
+            app._p_jar.close()
+
+    tasks, reports = _tasks(paths, urls, options.names or config.SITEMAPS,
+                            options.force, options.budget)
+    try:
+        if pool is None:
+            reports.extend(map(_regeneratesite, tasks))
+        else:
+            reports.extend(pool.map(_regeneratesite, tasks, 1))
+    except:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        raise
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    for report in reports:
+        if report['error']:
+            print >> sys.stderr, '%s:\n%s' % (report['site'], report['error'])
+    print summary(reports)
+    if options.report:
+        fp = open(options.report, 'w')
+        try:
+            json.dump(reports, fp, indent=1)
+        finally:
+            fp.close()
+    return [report for report in reports if report['error']] and 1 or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Cost of sitemap shards with a full catalog sort and with sort_limit.
+
+Usage: python -m googlesitemap.common.benchmarks.catalog [entries] [maxlen]
+
+It needs Products.ZCatalog, run it with the python of your instance.
+"""
+
+import sys
+import time
+
+from googlesitemap.common import config
+from googlesitemap.common.benchmarks.synthetic import make_catalog
+
+# what portal_catalog searches for anonymous users
+QUERY = {'allowedRolesAndUsers': ['Anonymous'],
+         'sort_on': 'Date',
+         'sort_order': 'reverse'}
+
+
+def shard(catalog, start, end, limit):
+    query = dict(QUERY)
+    if limit:
+        query['sort_limit'] = end
+    return [brain.getRID() for brain in catalog.searchResults(**query)[start:end]]
+
+
+def main(count=1000000, maxlen=config.MAXLEN):
+    started = time.time()
+    catalog = make_catalog(count)
+    print 'catalog:    %d entries in %.2fs' % (count, time.time() - started)
+
+    shards = (count - 1) / maxlen + 1
+    for index in sorted(set([0, 1, shards / 2, shards - 1])):
+        start = index * maxlen
+        end = start + maxlen
+        timings = []
+        results = []
+        for limit in (False, True):
+            started = time.time()
+            results.append(shard(catalog, start, end, limit))
+            timings.append(time.time() - started)
+        print 'shard %4d: full sort %.2fs, sort_limit %.2fs, identical: %s' % (
+            index, timings[0], timings[1], results[0] == results[1])
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,137 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Generation time, throughput and peak memory of sitemaps.
+
+Usage: python -m googlesitemap.common.benchmarks.generation [entries ...]
+
+Sitemaps are generated by SiteMapCommonView from a stub site with a
+synthetic ZCatalog (see synthetic.make_catalog), of 10000, 100000 and
+1000000 entries by default. benchmarks.plonesite takes the same measures
+in the PloneTestCase site of the tests.
+
+It needs Zope2, run it with the python of your instance.
+"""
+
+import sys
+import time
+
+from googlesitemap.common import cache
+from googlesitemap.common.sitemap import SiteMapCommonView
+from googlesitemap.common.benchmarks.synthetic import PORTAL_URL
+from googlesitemap.common.benchmarks.synthetic import make_catalog
+
+SIZES = (10000, 100000, 1000000)
+
+
+def peak_memory():
+    """ Peak resident memory of the process (megabytes), None if unknown """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # bytes instead of kilobytes
+        peak /= 1024
+    return peak / 1024.0
+
+
+def measure(view, index):
+    """ Generates the sitemap (or its index) when index is None or the shard
+        index, returns the seconds spent, the number of entries and the gzip size
+    """
+    view.index = index
+    # a new memory cache, blocks compressed by the previous runs aren't reused
+    cache._memorycache = None
+    started = time.time()
+    data = view._uncachedgenerate()
+    elapsed = time.time() - started
+    if index is None and view._windowbrains()[1] >= view.maxlen:
+        entries = len(list(view.sitemaps()))
+    else:
+        entries = len(view._slicecatalogbrains())
+    return elapsed, entries, len(data)
+
+
+def report(factory, count):
+    """ Prints the measures of the sitemaps of count entries, factory gives
+        a new view for each of them (so that brains are searched again)
+    """
+    print '%d entries' % count
+    shards = (count - 1) / factory().maxlen + 1
+    names = [None]
+    if shards > 1:
+        names.extend(sorted(set([0, shards / 2, shards - 1])))
+    for index in names:
+        elapsed, entries, size = measure(factory(), index)
+        if index is not None:
+            name = 'shard %d' % index
+        elif shards > 1:
+            name = 'index'
+        else:
+            name = 'sitemap'
+        peak = peak_memory()
+        print '  %-11s %6d entries %7.2fs %9.0f entries/s %7d KB, peak memory %s MB' % (
+            name, entries, elapsed, entries / max(elapsed, 0.000001), size / 1024,
+            peak is None and '?' or '%.0f' % peak)
+
+
+class StubSiteMapView(SiteMapCommonView):
+    """ SiteMapCommonView of a stub site with a synthetic catalog """
+
+    def __init__(self, catalog):
+        super(StubSiteMapView, self).__init__(Portal(), Request())
+        self.catalog = catalog
+
+    def portal_url(self):
+        return PORTAL_URL
+
+    def urlresolver(self):
+        from googlesitemap.common import metadata
+        return metadata.URLResolver('/plone', PORTAL_URL)
+
+    def _searchcatalog(self, **query):
+        self.catalog_queries += 1
+        query = dict(query)
+        # not indexed, the synthetic catalog has only what anonymous users see
+        query.pop('Language', None)
+        query['allowedRolesAndUsers'] = ['Anonymous']
+        return self.catalog.searchResults(**query)
+
+
+class Portal(object):
+
+    def absolute_url(self):
+        return PORTAL_URL
+
+    def getPhysicalPath(self):
+        return ('', 'plone')
+
+
+class Request(object):
+    index = None
+    part = None
+
+
+def main(*sizes):
+    for count in sizes or SIZES:
+        started = time.time()
+        catalog = make_catalog(count)
+        print 'catalog of %d entries built in %.2fs' % (count, time.time() - started)
+        report(lambda: StubSiteMapView(catalog), count)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
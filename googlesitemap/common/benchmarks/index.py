@@ -0,0 +1,78 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Cost of the sitemap index, that must depend on the number of shards only.
+
+Usage: python -m googlesitemap.common.benchmarks.index [maxlen]
+
+It needs Zope2 (for the view), run it with the python of your instance.
+"""
+
+import sys
+import time
+
+from googlesitemap.common import metadata
+from googlesitemap.common.sitemap import SiteMapCommonView
+from googlesitemap.common.benchmarks.synthetic import PORTAL_URL
+from googlesitemap.common.benchmarks.synthetic import LazyBrains
+
+
+class Request(object):
+    index = None
+    part = None
+
+
+class IndexView(SiteMapCommonView):
+    """ The sitemap index of LazyBrains """
+
+    maxlen = 1000
+
+    def __init__(self, brains):
+        super(IndexView, self).__init__(None, Request())
+        self.brains = brains
+
+    def portal_url(self):
+        return PORTAL_URL
+
+    def _searchbrains(self, end=None):
+        return self.brains, len(self.brains)
+
+
+def index(count, maxlen):
+    """ Seconds spent listing the shards of count items, twice (the second
+        time with cached dates), and the number of shards and of loaded brains
+    """
+    brains = LazyBrains(count)
+    metadata._isodates.clear()
+    timings = []
+    for i in range(2):
+        started = time.time()
+        view = IndexView(brains)
+        view.maxlen = maxlen
+        shards = len(list(view.sitemaps()))
+        timings.append(time.time() - started)
+    return timings, shards, brains.accessed / 2
+
+
+def main(maxlen=1000):
+    for count in (10 ** 5, 10 ** 6, 10 ** 7):
+        timings, shards, accessed = index(count, maxlen)
+        print '%8d items: %5d shards, %5d brains loaded, %.1f us/shard, cached dates %.1f us/shard' % (
+            count, shards, accessed, timings[0] * 1000000 / shards, timings[1] * 1000000 / shards)
+        if accessed != shards:
+            raise AssertionError('%d brains loaded for %d shards' % (accessed, shards))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
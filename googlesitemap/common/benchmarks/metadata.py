@@ -0,0 +1,59 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Cost of brain.getURL()/modified.HTML4() and of the metadata fast path.
+
+Usage: python -m googlesitemap.common.benchmarks.metadata [entries]
+
+It needs Zope2 (for a real request), run it with the python of your instance.
+"""
+
+import sys
+import time
+
+from OFS.Application import Application
+from Testing.makerequest import makerequest
+
+from googlesitemap.common import metadata
+from googlesitemap.common.benchmarks.synthetic import PORTAL_URL
+from googlesitemap.common.benchmarks.synthetic import make_brains
+
+
+def slow(brains, request):
+    return [(request.physicalPathToURL(brain.getPath()), brain.modified.HTML4())
+            for brain in brains]
+
+
+def fast(brains, request):
+    url = metadata.URLResolver('/plone', PORTAL_URL)
+    lastmod = metadata.lastmod
+    return [(url(brain), lastmod(brain.modified)) for brain in brains]
+
+
+def main(count=50000):
+    brains = make_brains(count)
+    request = makerequest(Application()).REQUEST
+    results = []
+    for function in (slow, fast):
+        metadata._lastmods.clear()
+        started = time.time()
+        results.append(function(brains, request))
+        elapsed = time.time() - started
+        print '%-5s %.2fs, %.1f us/entry' % (function.__name__, elapsed,
+                                             elapsed * 1000000 / count)
+    print 'identical:', results[0] == results[1]
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,74 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" The generation benchmarks in the PloneTestCase site of the tests.
+
+They aren't collected with the tests, run them with the zope testrunner::
+
+    bin/test -s googlesitemap.common --tests-pattern=^benchmarks$ --test-file-pattern=^plonesite$
+
+Synthetic entries are cataloged straight into portal_catalog, without
+creating contents: SITEMAP_BENCHMARK_SIZES=10000,100000 chooses how many
+(default 10000, 100000 and 1000000, see generation.SIZES).
+"""
+
+import os
+
+from DateTime import DateTime
+from zope.component import getMultiAdapter
+
+from Products.CMFCore.utils import getToolByName
+
+from googlesitemap.common.tests.base import TestCase
+from googlesitemap.common.benchmarks.generation import SIZES
+from googlesitemap.common.benchmarks.generation import report
+from googlesitemap.common.benchmarks.synthetic import FakeContent
+
+
+class GenerationBenchmark(TestCase):
+    """ Generation time, throughput and peak memory in a Plone site """
+
+    def afterSetUp(self):
+        site_properties = getToolByName(self.portal, 'portal_properties').site_properties
+        site_properties.manage_changeProperties(enable_sitemap=True)
+
+    def sizes(self):
+        sizes = os.environ.get('SITEMAP_BENCHMARK_SIZES', None)
+        if not sizes:
+            return SIZES
+        return [int(size) for size in sizes.split(',')]
+
+    def catalog(self, start, end):
+        """ Catalogs the synthetic entries from start to end, older ones last """
+        catalog = getToolByName(self.portal, 'portal_catalog')._catalog
+        now = DateTime().timeTime()
+        for rid in xrange(start, end):
+            obj = FakeContent(rid, DateTime(now - rid * 60))
+            catalog.catalogObject(obj, '/plone/folder-%d/item-%d' % (rid / 1000, rid))
+
+    def sitemap(self):
+        return getMultiAdapter((self.portal, self.portal.REQUEST),
+                               name='sitemapindex.xml.gz')
+
+    def test_generation(self):
+        cataloged = 0
+        for count in self.sizes():
+            self.catalog(cataloged, count)
+            cataloged = count
+            report(self.sitemap, self.sitemap()._windowbrains()[1])
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
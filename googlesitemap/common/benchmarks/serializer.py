@@ -0,0 +1,77 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Per-entry cost of the sitemap serializer compared to the TAL template.
+
+Usage: python -m googlesitemap.common.benchmarks.serializer [entries]
+"""
+
+import os
+import sys
+import time
+
+from zope.pagetemplate.pagetemplatefile import PageTemplateFile
+
+from googlesitemap.common import serializer
+from googlesitemap.common import config
+from googlesitemap.common.benchmarks.synthetic import make_brains
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(config.__file__)),
+                        'sitemap.xml')
+
+
+class SitemapTemplate(PageTemplateFile):
+    """ sitemap.xml rendered with the same engine used by ViewPageTemplateFile """
+
+    def pt_getContext(self, args=(), options={}, **kw):
+        namespace = super(SitemapTemplate, self).pt_getContext(args, options, **kw)
+        namespace['view'] = options['view']
+        return namespace
+
+
+class Objects(object):
+    """ Provides objects() to the template """
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def objects(self):
+        return iter(self.entries)
+
+
+def entries(brains):
+    return [{'loc': brain.getURL(), 'lastmod': brain.modified.HTML4()}
+            for brain in brains]
+
+
+def timeit(func, *args, **kw):
+    started = time.time()
+    result = func(*args, **kw)
+    return time.time() - started, result
+
+
+def main(count=config.MAXLEN):
+    data = entries(make_brains(count))
+    template = SitemapTemplate(TEMPLATE)
+    template_time, expected = timeit(template, view=Objects(data))
+    serializer_time, xml = timeit(''.join, serializer.urlset(data))
+
+    print 'entries:    %d' % count
+    print 'template:   %.2fs (%.2f us/entry)' % (template_time, template_time / count * 1e6)
+    print 'serializer: %.2fs (%.2f us/entry)' % (serializer_time, serializer_time / count * 1e6)
+    print 'identical:  %s' % (expected == xml)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,123 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Synthetic catalog brains used by benchmarks """
+
+from DateTime import DateTime
+
+PORTAL_URL = 'http://nohost/plone'
+PORTAL_TYPES = ('Document', 'Document', 'Folder', 'News Item', 'File', 'Image')
+
+
+class FakeBrain(object):
+    """ The subset of a catalog brain used by sitemap views """
+
+    def __init__(self, rid, portal_type, path, modified):
+        self.rid = rid
+        self.portal_type = portal_type
+        self.path = path
+        self.modified = modified
+        self.Date = modified.ISO()
+
+    def getRID(self):
+        return self.rid
+
+    def getPath(self):
+        return self.path
+
+    def getURL(self):
+        return PORTAL_URL + self.path[len('/plone'):]
+
+
+def make_brains(count, start=None):
+    """ count brains sorted by reverse Date, one minute apart """
+    if start is None:
+        start = DateTime('2012/05/04 12:00:00 GMT+0')
+    start = start.timeTime()
+    brains = []
+    for rid in xrange(count):
+        portal_type = PORTAL_TYPES[rid % len(PORTAL_TYPES)]
+        path = '/plone/folder-%d/item-%d' % (rid / 1000, rid)
+        modified = DateTime(start - rid * 60)
+        brains.append(FakeBrain(rid, portal_type, path, modified))
+    return brains
+
+
+class LazyBrains(object):
+    """ count brains sorted by reverse Date, made when accessed by position
+        like the lazy results of the catalog. Counts the accessed brains.
+    """
+
+    def __init__(self, count, start=None):
+        if start is None:
+            start = DateTime('2012/05/04 12:00:00 GMT+0')
+        self.count = count
+        self.start = start.timeTime()
+        self.accessed = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            raise TypeError('slicing would load many brains')
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        self.accessed += 1
+        portal_type = PORTAL_TYPES[index % len(PORTAL_TYPES)]
+        path = '/plone/folder-%d/item-%d' % (index / 1000, index)
+        return FakeBrain(index, portal_type, path, DateTime(self.start - index * 60))
+
+
+class FakeContent(object):
+    """ A content object with what is indexed for sitemaps """
+
+    def __init__(self, rid, modified):
+        self.portal_type = PORTAL_TYPES[rid % len(PORTAL_TYPES)]
+        self.modified = modified
+        self.Date = modified.ISO()
+        self.allowedRolesAndUsers = ['Anonymous']
+        # neutral, as new Plone contents
+        self.Language = ''
+
+
+def make_catalog(count, start=None):
+    """ A catalog with a Date index of count contents, one minute apart """
+    from Acquisition import Implicit
+    from Products.ZCatalog.Catalog import Catalog
+    from Products.PluginIndexes.DateIndex.DateIndex import DateIndex
+    from Products.PluginIndexes.KeywordIndex.KeywordIndex import KeywordIndex
+
+    if start is None:
+        start = DateTime('2012/05/04 12:00:00 GMT+0')
+    start = start.timeTime()
+    catalog = Catalog()
+    catalog.addIndex('Date', DateIndex('Date'))
+    catalog.addIndex('allowedRolesAndUsers', KeywordIndex('allowedRolesAndUsers'))
+    for column in ('Date', 'portal_type', 'modified'):
+        catalog.addColumn(column)
+    # oldest first, as contents are usually created
+    for rid in xrange(count - 1, -1, -1):
+        obj = FakeContent(rid, DateTime(start - rid * 60))
+        catalog.catalogObject(obj, '/plone/folder-%d/item-%d' % (rid / 1000, rid))
+    class CatalogParent(Implicit):
+        """ What brains need from the ZCatalog holding the catalog """
+
+        def getpath(self, rid):
+            return catalog.paths[rid]
+
+    # brains are wrapped in the parent of the catalog
+    return catalog.__of__(CatalogParent())
@@ -0,0 +1,334 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Cache backends for generated sitemaps.
+
+By default generated sitemaps are cached in the RAM of each Zope process,
+within memory-cache-size megabytes (0 uses the plone.memoize RAM cache).
+ZEO clients on the same host can share them in a directory instead::
+
+    <product-config googlesitemap.common>
+        cache-directory /var/cache/sitemaps
+        cache-size 512
+    </product-config>
+
+(cache-size is in megabytes). Other backends are utilities providing
+ISitemapCache.
+
+Cache keys are name@version: a new version of a sitemap makes the previous
+ones useless.
+"""
+
+import os
+import errno
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # no locks on Windows
+    fcntl = None
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
+
+from zope.component import queryUtility
+from zope.interface import implements
+
+from googlesitemap.common.interfaces import ISitemapCache
+from googlesitemap.common import config
+from googlesitemap.common import storage
+
+# keys share this number of locks
+LOCKS = 256
+
+# locks of the caches without their own, see threadLock
+_threadlocks = [threading.Lock() for i in range(LOCKS)]
+
+
+# the FilesystemCache of this process, see getCache
+_filesystemcache = None
+
+
+def getCache():
+    """ The shared cache of generated sitemaps, None to use the RAM cache """
+    global _filesystemcache
+    cache = queryUtility(ISitemapCache)
+    if cache is not None:
+        return cache
+    directory = storage.getProductConfig('cache-directory', config.CACHE_DIRECTORY)
+    if not directory:
+        return None
+    maxsize = int(storage.getProductConfig('cache-size', config.CACHE_SIZE)) * 1024 * 1024
+    cache = _filesystemcache
+    if cache is None or cache.directory != directory or cache.maxsize != maxsize:
+        # a new one is as good as the old one, no need to lock
+        cache = _filesystemcache = FilesystemCache(directory, maxsize)
+    return cache
+
+
+# the MemoryCache of this process, see getMemoryCache
+_memorycache = None
+_memorycachelock = threading.Lock()
+
+
+def getMemoryCache():
+    """ The cache of generated sitemaps in the RAM of this process, None if
+        disabled
+    """
+    global _memorycache
+    maxsize = int(storage.getProductConfig('memory-cache-size', config.MEMORY_CACHE_SIZE) or 0)
+    if not maxsize:
+        return None
+    maxsize = maxsize * 1024 * 1024
+    cache = _memorycache
+    if cache is not None and cache.maxsize == maxsize:
+        return cache
+    _memorycachelock.acquire()
+    try:
+        if _memorycache is None:
+            _memorycache = MemoryCache(maxsize)
+        else:
+            _memorycache.maxsize = maxsize
+    finally:
+        _memorycachelock.release()
+    return _memorycache
+
+
+def _stripe(key):
+    return int(md5(key).hexdigest()[:4], 16) % LOCKS
+
+
+def threadLock(key):
+    """ A lock shared by the threads of this process for key """
+    return _threadlocks[_stripe(key)]
+
+
+class FileLock(object):
+    """ An exclusive lock shared by processes and threads """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self, blocking=True):
+        """ Takes the lock, returns False if it is held and not blocking """
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0644)
+        if fcntl is None:
+            return True
+        flags = fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(self.fd, flags)
+        except IOError, e:
+            os.close(self.fd)
+            self.fd = None
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                return False
+            raise
+        return True
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+
+class FilesystemCache(object):
+    """ Sitemaps cached in a directory, the least recently used ones are
+        removed when they take more than maxsize bytes
+    """
+    implements(ISitemapCache)
+
+    def __init__(self, directory, maxsize):
+        self.directory = directory
+        self.maxsize = maxsize
+
+    def _hash(self, key):
+        return md5(key).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, '%s.gz' % self._hash(key))
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            fp = open(path, 'rb')
+        except IOError:
+            return default
+        try:
+            data = fp.read()
+        finally:
+            fp.close()
+        try:
+            # recently used
+            os.utime(path, None)
+        except OSError:
+            # evicted meanwhile, we have read it anyway
+            pass
+        return data
+
+    def __setitem__(self, key, value):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        fp = os.fdopen(fd, 'wb')
+        try:
+            try:
+                fp.write(value)
+            finally:
+                fp.close()
+            os.rename(tmp, self._path(key))
+        except:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def lock(self, key):
+        """ The lock of key, held while its sitemap is generated """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        return FileLock(os.path.join(self.directory, 'lock-%d' % _stripe(key)))
+
+    def size(self):
+        """ Bytes taken by cached sitemaps """
+        return sum([size for mtime, size, path in self._entries()])
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.gz') or name.startswith('.'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """ Removes the least recently used sitemaps beyond maxsize """
+        entries = self._entries()
+        size = sum([entry[1] for entry in entries])
+        entries.sort()
+        while size > self.maxsize and entries:
+            mtime, entry_size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+
+class MemoryCache(object):
+    """ Sitemaps cached in RAM, within maxsize bytes. Storing a version of a
+        sitemap drops the previous ones, the least recently used sitemaps go
+        when they take more than maxsize bytes.
+    """
+    implements(ISitemapCache)
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        # key -> sitemap
+        self._data = {}
+        # key -> tick of its last use
+        self._used = {}
+        # name -> key of its cached version
+        self._versions = {}
+        self._tick = 0
+        self._size = 0
+        self.hits = self.misses = self.evictions = self.replaced = 0
+
+    def get(self, key, default=None):
+        self._lock.acquire()
+        try:
+            data = self._data.get(key, None)
+            if data is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._tick += 1
+            self._used[key] = self._tick
+            return data
+        finally:
+            self._lock.release()
+
+    def __setitem__(self, key, value):
+        name = key.rpartition('@')[0] or key
+        if len(value) > self.maxsize:
+            # not stored, the previous version stays
+            return
+        self._lock.acquire()
+        try:
+            previous = self._versions.get(name, None)
+            if previous is not None:
+                if previous != key:
+                    self.replaced += 1
+                self._remove(previous)
+            self._tick += 1
+            self._data[key] = value
+            self._used[key] = self._tick
+            self._versions[name] = key
+            self._size += len(value)
+            self._evict()
+        finally:
+            self._lock.release()
+
+    def _remove(self, key):
+        value = self._data.pop(key, None)
+        if value is None:
+            return
+        del self._used[key]
+        name = key.rpartition('@')[0] or key
+        if self._versions.get(name, None) == key:
+            del self._versions[name]
+        self._size -= len(value)
+
+    def _evict(self):
+        """ Removes the least recently used sitemaps beyond maxsize """
+        if self._size <= self.maxsize:
+            return
+        used = [(tick, key) for key, tick in self._used.items()]
+        used.sort()
+        for tick, key in used:
+            if self._size <= self.maxsize:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def size(self):
+        """ Bytes taken by cached sitemaps """
+        return self._size
+
+    def usage(self):
+        """ Memory usage and counters of the cache """
+        self._lock.acquire()
+        try:
+            return {'entries': len(self._data),
+                    'bytes': self._size,
+                    'maxsize': self.maxsize,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'replaced': self.replaced,
+                   }
+        finally:
+            self._lock.release()
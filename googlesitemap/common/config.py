@@ -13,3 +13,93 @@
 # Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
 # 02111-1307, USA.
 MAXLEN = 50000
+
+# max number of sitemaps listed by a sitemap index file (protocol limit).
+# Sites with more shards get several index files, see indexes()
+MAXSHARDS = 50000
+
+# search the catalog as the anonymous user for everybody, so that authenticated
+# users get the same (cached) sitemap
+ANONYMOUS_QUERY = False
+
+# gzip compression level of generated sitemaps. 9 costs about 3 times the
+# cpu of 6 for files just a bit smaller
+COMPRESSLEVEL = 6
+
+# serialized xml is compressed and written in chunks of this size (bytes)
+CHUNKSIZE = 64 * 1024
+
+# average number of sitemap entries compressed in a gzip member of their own:
+# after a change only the members of the changed blocks are compressed again
+# (0 compresses every sitemap in a single member)
+BLOCKSIZE = 1000
+
+# sitemaps not yet cached are written to the response while they are generated
+STREAMING = False
+
+# number of content changes remembered for invalidating sitemap shards.
+# Sitemaps older than that are regenerated
+MAXCHANGES = 10000
+
+# number of paths whose Date is remembered for invalidating sitemap shards.
+# When there are more they are all forgotten: their next change affects every shard
+MAXDATES = 100000
+
+# directory of pre-generated sitemaps, usually configured in zope.conf
+# (see storage). None means sitemaps are generated on request
+DIRECTORY = None
+
+# names of the sitemap views rebuilt by the regeneration entry points
+SITEMAPS = ('sitemap.xml.gz',)
+
+# shards ending within the first 1/SORT_LIMIT_RATIO of the brains are searched
+# with sort_limit. ZCatalog partial sorts of larger windows are slower than
+# sorting everything, see benchmarks.catalog
+SORT_LIMIT_RATIO = 50
+
+# while a sitemap is regenerated other requests get its previous version
+# instead of waiting for it
+STALE_WHILE_REVALIDATE = False
+
+# send ETag and Last-Modified headers and answer conditional requests with 304
+CONDITIONAL = True
+
+# Cache-Control header of the sitemaps served to anonymous users, None for none
+CACHE_CONTROL = None
+
+# directory of the cache of generated sitemaps shared by the Zope processes of
+# a host, usually configured in zope.conf (see cache). None means RAM cache
+CACHE_DIRECTORY = None
+
+# size of the shared cache (megabytes)
+CACHE_SIZE = 512
+
+# size of the cache of generated sitemaps in the RAM of each process
+# (megabytes), usually configured in zope.conf (see cache). 0 means the
+# plone.memoize RAM cache
+MEMORY_CACHE_SIZE = 256
+
+# number of sitemap names (urls or paths of sitemaps) each process remembers
+# the last version of. When there are more they are all forgotten
+MAXNAMES = 10000
+
+# the sitemap of the recently changed items (see recent) lists what changed in
+# the last RECENT_HOURS hours, unless asked otherwise
+RECENT_HOURS = 24
+
+# the sitemap of the recently changed items goes back at most RECENT_MAX_HOURS
+# hours, whatever ?hours or ?since ask: older changes are in the shards
+RECENT_MAX_HOURS = 24 * 7
+
+# seconds the sitemap of the recently changed items is cached
+RECENT_TTL = 300
+
+# number of sitemap requests listed by the @@sitemap-stats view
+STATS_RECENT = 100
+
+# host:port of a statsd daemon receiving the sitemap stats, usually configured
+# in zope.conf (see stats). None means no statsd
+STATSD = None
+
+# prefix of the statsd metrics
+STATSD_PREFIX = 'googlesitemap'
@@ -0,0 +1,325 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" A persistent store of the entries of the sitemap of anonymous users.
+
+The entries of the items anonymous users can view are kept sorted by reverse
+Date, the order of the sitemap, and maintained by the content events: the
+sitemap reads them sequentially instead of sorting the whole catalog.
+
+The store is built by @@sitemap-entries (or rebuild) and then kept up to date
+by the subscribers below. Until then sitemaps search the catalog. Changes of
+permissions without events (eg. the sharing tab before Plone 4.1, the security
+settings of workflows) aren't seen: rebuild the store after them.
+"""
+
+import time
+
+from AccessControl.PermissionRole import rolesForPermissionOn
+from Acquisition import aq_base
+from DateTime import DateTime
+from persistent import Persistent
+from BTrees.OOBTree import OOBTree
+from BTrees.OOBTree import OOTreeSet
+from BTrees.Length import Length
+from zope.annotation.interfaces import IAnnotations
+from zope.lifecycleevent.interfaces import IObjectAddedEvent
+from zope.lifecycleevent.interfaces import IObjectRemovedEvent
+
+from Products.Five import BrowserView
+from Products.CMFCore.interfaces import IContentish
+from Products.CMFCore.utils import getToolByName
+
+from googlesitemap.common import invalidation
+
+ANNOTATION_KEY = 'googlesitemap.common.entries'
+
+# the query whose results are stored, the one of the standard sitemap
+QUERY = {'Language': 'all',
+         'sort_on': 'Date',
+         'sort_order': 'reverse',
+        }
+
+# expiration dates after this one mean never (CEILING_DATE is the year 2500)
+NEVER = DateTime('2499/12/31 GMT').timeTime()
+
+
+class Entry(object):
+    """ A stored sitemap entry, with the brain metadata used by the sitemaps of
+        SiteMapCommonView: Date as the catalog has it, modified in seconds
+    """
+
+    __slots__ = ('path', 'Date', 'modified', 'portal_type')
+
+    def __init__(self, key, value):
+        self.path = key[1]
+        self.Date, self.modified, self.portal_type = value
+
+    def getPath(self):
+        return self.path
+
+
+class Entries(object):
+    """ The visible stored entries as a sequence of brain-like items, newest first.
+        items are all the stored ones, hidden the sorted keys of the ones
+        not visible: positions are moved past the hidden keys in front of them.
+    """
+
+    def __init__(self, items, count, hidden=()):
+        self.items = items
+        self.count = count
+        self.hidden = hidden
+        self._hidden = set(hidden)
+
+    def __len__(self):
+        return self.count
+
+    def _position(self, index):
+        """ Position in items of the visible entry at index """
+        position = index
+        for key in self.hidden:
+            if key > self.items[position][0]:
+                break
+            position += 1
+        return position
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step != 1:
+                raise ValueError('Entries slices have no step')
+            if start >= stop:
+                return []
+            entries = []
+            for key, value in self.items[self._position(start):]:
+                if key in self._hidden:
+                    continue
+                entries.append(Entry(key, value))
+                if len(entries) == stop - start:
+                    break
+            return entries
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return Entry(*self.items[self._position(index)])
+
+    def __iter__(self):
+        for key, value in self.items:
+            if key not in self._hidden:
+                yield Entry(key, value)
+
+
+class SitemapEntries(Persistent):
+    """ The entries of the sitemap of anonymous users, sorted by reverse Date """
+
+    def __init__(self):
+        # (-Date in seconds, path) -> (Date, modified, portal_type) of every entry
+        self.entries = OOBTree()
+        # path -> its key in entries
+        self.keys = OOBTree()
+        self.count = Length()
+        # (-Date, path) -> (effective, expires) of the few entries visible only
+        # for a while: not yet effective or expiring
+        self.windows = OOBTree()
+        # (effective, key) of the entries not yet effective
+        self.starts = OOTreeSet()
+
+    def index(self, path, date, modified, portal_type, effective, expires, Date=None):
+        """ Adds or updates the entry of path, dates are numbers. Date is the
+            Date metadata as the catalog has it, date by default.
+        """
+        self.unindex(path)
+        now = time.time()
+        key = (-date, path)
+        if Date is None:
+            Date = date
+        self.entries[key] = (Date, modified, portal_type)
+        self.keys[path] = key
+        self.count.change(1)
+        if effective > now or expires < NEVER:
+            self.windows[key] = (effective, expires)
+            if effective > now:
+                self.starts.insert((effective, key))
+        self._settle(now)
+
+    def unindex(self, path):
+        """ Removes the entry of path, if any """
+        key = self.keys.get(path, None)
+        if key is None:
+            return
+        del self.entries[key]
+        del self.keys[path]
+        self.count.change(-1)
+        window = self.windows.get(key, None)
+        if window is not None:
+            del self.windows[key]
+            if (window[0], key) in self.starts:
+                self.starts.remove((window[0], key))
+
+    def _settle(self, now):
+        """ Entries effective by now and never expiring are always visible:
+            they leave windows
+        """
+        while self.starts and self.starts.minKey()[0] <= now:
+            effective, key = self.starts.minKey()
+            self.starts.remove((effective, key))
+            if self.windows[key][1] >= NEVER:
+                del self.windows[key]
+
+    def __len__(self):
+        return self.count()
+
+    def visible(self, now=None):
+        """ The entries visible at now, newest first. They are read lazily from
+            the stored ones, positional access skips whole buckets and the
+            few entries hidden at now.
+        """
+        if now is None:
+            now = time.time()
+        hidden = [key for key, (effective, expires) in self.windows.items()
+                  if not effective <= now <= expires]
+        return Entries(self.entries.items(), self.count() - len(hidden), hidden)
+
+
+def _time(value, default):
+    """ A DateTime as a number, default when it is missing """
+    if not isinstance(value, DateTime):
+        return default
+    return value.timeTime()
+
+
+def entriesOf(portal):
+    """ The entry store of the portal, None if it has not been built.
+        Like invalidation.token it skips tools, adapters and acquisition.
+    """
+    annotations = getattr(aq_base(portal), '__annotations__', None)
+    if annotations is None:
+        return None
+    return annotations.get(ANNOTATION_KEY, None)
+
+
+def getEntries(context):
+    """ The entry store of the portal of context, None if it has not been built """
+    portal_url = getToolByName(context, 'portal_url', None)
+    if portal_url is None:
+        return None
+    return entriesOf(portal_url.getPortalObject())
+
+
+def rebuild(portal):
+    """ Builds the entry store of portal from the catalog, returns it """
+    catalog = getToolByName(portal, 'portal_catalog')
+    store = SitemapEntries()
+    # every language, effective and expires are checked when the entries are read
+    for brain in catalog.unrestrictedSearchResults(allowedRolesAndUsers='Anonymous'):
+        store.index(brain.getPath(),
+                    invalidation.dateOf(brain.Date),
+                    _time(brain.modified, 0.0),
+                    brain.portal_type,
+                    _time(brain.effective, float('-inf')),
+                    _time(brain.expires, float('inf')),
+                    brain.Date)
+    IAnnotations(portal)[ANNOTATION_KEY] = store
+    # what was generated from the catalog may differ
+    changes = invalidation.getChanges(portal, create=True)
+    if changes is not None:
+        changes.record(invalidation.MAXDATE, invalidation.MINDATE, True)
+    return store
+
+
+def _path(obj):
+    return '/'.join(obj.getPhysicalPath())
+
+
+def _oldpath(obj, event):
+    """ The path of obj before the move. Events of the items of moved folders
+        carry the old and the new place of the folder.
+    """
+    oldtop = '/'.join(event.oldParent.getPhysicalPath() + (event.oldName,))
+    newtop = '/'.join(event.newParent.getPhysicalPath() + (event.newName,))
+    return oldtop + _path(obj)[len(newtop):]
+
+
+def _update(store, obj):
+    """ Stores the entry of obj if anonymous users can view it, removes it otherwise """
+    path = obj.getPhysicalPath()
+    if 'portal_factory' in path or 'Anonymous' not in rolesForPermissionOn('View', obj):
+        store.unindex('/'.join(path))
+        return
+    # the catalog stores what Date() returns
+    Date = obj.Date()
+    store.index('/'.join(path),
+                invalidation.dateOf(Date),
+                _time(obj.modified(), 0.0),
+                obj.portal_type,
+                _time(obj.effective(), float('-inf')),
+                _time(obj.expires(), float('inf')),
+                Date)
+
+
+def _contents(obj):
+    """ obj and the content below it """
+    yield obj
+    if getattr(aq_base(obj), 'isPrincipiaFolderish', False):
+        for item in obj.objectValues():
+            if IContentish.providedBy(item):
+                for content in _contents(item):
+                    yield content
+
+
+def objectMoved(obj, event):
+    """ Objects added, removed or renamed """
+    store = getEntries(obj)
+    if store is None:
+        return
+    if IObjectRemovedEvent.providedBy(event):
+        store.unindex(_path(obj))
+        return
+    if not IObjectAddedEvent.providedBy(event):
+        store.unindex(_oldpath(obj, event))
+    _update(store, obj)
+
+
+def objectModified(obj, event):
+    """ Objects edited """
+    store = getEntries(obj)
+    if store is not None:
+        _update(store, obj)
+
+
+def actionSucceeded(obj, event):
+    """ Workflow transitions may change who can see obj and the content it contains """
+    store = getEntries(obj)
+    if store is not None:
+        for content in _contents(obj):
+            _update(store, content)
+
+
+def localrolesModified(obj, event):
+    """ Sharing may change who can see obj and the content it contains """
+    store = getEntries(obj)
+    if store is not None:
+        for content in _contents(obj):
+            if IContentish.providedBy(content):
+                _update(store, content)
+
+
+class EntriesView(BrowserView):
+    """ Rebuilds the entry store of the site from the catalog """
+
+    def __call__(self):
+        store = rebuild(self.context)
+        self.request.response.setHeader('Content-Type', 'text/plain')
+        return '%d entries' % len(store)
@@ -0,0 +1,111 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Incremental gzip compression.
+
+Sitemap chunks are compressed as soon as they are serialized, so we never
+hold the whole uncompressed xml in memory. The output is a standard gzip
+file, the same GzipFile would write.
+
+A gzip file may also be made of many members, one after the other: it
+decompresses to their contents joined. Sitemaps are written this way one
+block of entries at a time, see member.
+"""
+
+import struct
+import time
+import zlib
+from gzip import GzipFile
+from StringIO import StringIO
+
+from googlesitemap.common import config
+
+
+class GzipStream(object):
+    """ Compresses data written in many steps into a single gzip member """
+
+    def __init__(self, filename='', level=config.COMPRESSLEVEL, mtime=None):
+        if filename.endswith('.gz'):
+            filename = filename[:-3]
+        if mtime is None:
+            mtime = time.time()
+        self.filename = filename
+        self.mtime = mtime
+        self.crc = zlib.crc32('') & 0xffffffffL
+        self.size = 0
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                           zlib.DEF_MEM_LEVEL, 0)
+        self.header = self._header()
+
+    def _header(self):
+        flags = self.filename and '\010' or '\000'
+        header = ['\037\213\010', flags, struct.pack('<L', long(self.mtime)), '\002\377']
+        if self.filename:
+            header.extend([self.filename, '\000'])
+        return ''.join(header)
+
+    def _pending(self, data):
+        if self.header:
+            data = self.header + data
+            self.header = ''
+        return data
+
+    def write(self, data):
+        """ Compresses data, returns the gzip bytes available so far """
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self.crc = zlib.crc32(data, self.crc) & 0xffffffffL
+        self.size += len(data)
+        return self._pending(self.compressor.compress(data))
+
+    def close(self):
+        """ Returns the last gzip bytes, trailer included """
+        data = self.compressor.flush()
+        trailer = struct.pack('<LL', self.crc, self.size & 0xffffffffL)
+        return self._pending(data + trailer)
+
+
+def compress(chunks, filename='', level=config.COMPRESSLEVEL,
+             chunksize=config.CHUNKSIZE, mtime=None):
+    """ Yields the gzip data of chunks, in pieces of about chunksize bytes """
+    stream = GzipStream(filename, level, mtime)
+    buf = []
+    buflen = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buflen += len(chunk)
+        if buflen >= chunksize:
+            data = stream.write(''.join(buf))
+            buf = []
+            buflen = 0
+            if data:
+                yield data
+    yield stream.write(''.join(buf)) + stream.close()
+
+
+def member(data, filename='', level=config.COMPRESSLEVEL, mtime=0):
+    """ data as a whole gzip member, by default without time so that the
+        same data always gives the same bytes
+    """
+    stream = GzipStream(filename, level, mtime)
+    return stream.write(data) + stream.close()
+
+
+def decompress(data):
+    """ The uncompressed content of gzip data """
+    gzip = GzipFile(fileobj=StringIO(data))
+    try:
+        return gzip.read()
+    finally:
+        gzip.close()
@@ -19,20 +19,59 @@ from zope.interface import Attribute
 class ISitemapLayer(Interface):
     """ Layer interface """
 
+class ISitemapCache(Interface):
+    """ Cache of generated sitemaps. Keys are name@version, a new version of
+        a sitemap makes the previous ones useless.
+    """
+
+    def get(key, default=None):
+        """ The sitemap cached as key, default if missing """
+
+    def __setitem__(key, value):
+        """ Caches the sitemap value as key """
+
+    def lock(key):
+        """ A lock held while the sitemap cached as key is generated, with the
+            acquire(blocking=True) and release() methods of threading.Lock.
+            Caches without it are locked by the threads of each process.
+        """
+
 class ISiteMapView(Interface):
     """ Sitemap view """
 
     template = Attribute("""Template used for sitemap generation""")
     indextemplate = Attribute("""Template used for sitemap indexes""")
+    use_template = Attribute("""Render with template and indextemplate instead of the built-in serializer""")
 
     maxlen = Attribute("""The maximum number of items for sitemap""")
+    maxshards = Attribute("""The maximum number of sitemaps listed by a sitemap index file""")
+    compresslevel = Attribute("""The gzip compression level of generated sitemaps""")
+    blocksize = Attribute("""Entries compressed in a gzip member of their own, 0 for a single member""")
+    anonymous_query = Attribute("""Search the catalog as the anonymous user for everybody, sharing the cached sitemap""")
     query_dict = Attribute("""The catalog query used for get sitemap elements""")
     filename = Attribute("""The generated sitemap's filename""")
     enable_sitemap = Attribute("""Sitemap generation available only if enable_sitemap is enabled""")
+    streaming = Attribute("""Write sitemaps to the response while they are generated""")
+    catalog_queries = Attribute("""Number of catalog searches issued by the view""")
+    store = Attribute("""Where pre-generated sitemaps are stored, None if they are generated on request""")
+    stale_while_revalidate = Attribute("""Serve the previous version of sitemaps being regenerated instead of waiting""")
+    stale = Attribute("""True when generate returned the previous version of the sitemap""")
+    stats = Attribute("""Timings and counters of the request (see stats.GenerationStats)""")
+    urlvariants = Attribute("""portal_type -> producer of the entries of its items (see variants)""")
+    defaultvariants = Attribute("""Producer of the entries of the items of the other types""")
+    use_entries = Attribute("""Read the sitemap of anonymous users from the entry store, see entries""")
+    conditional = Attribute("""Send ETag and Last-Modified headers and answer conditional requests with 304""")
+    cache_control = Attribute("""Cache-Control header of sitemaps served to anonymous users, None for none""")
+
+    def anonymous_sitemap():
+        """ True if the current user gets the sitemap of anonymous users """
 
     def sitemaps():
         """Get sitemaps data when using indexes of sitemaps"""
 
+    def indexes():
+        """ Urls of the sitemap index files, more than one when there are more than maxshards sitemaps """
+
     def getStartEnd():
         """ Get window slice of brains used for indexes of sitemaps"""
 
@@ -41,12 +80,25 @@ class ISiteMapView(Interface):
            generate sitemap indexes.
         """
 
+    def gzipname():
+        """ Name of the file inside the Gzipped sitemap, also used for storing it """
+
     def generate():
         """ Generates the cached Gzipped sitemap.
             You can just override this method for change caching policy (different kind of sitemaps may have
             different settings).
         """
 
+    def stream(validators=None):
+        """ Writes the Gzipped sitemap to the response while it is generated, sharing the
+            generate cache and its lock. Cached sitemaps, and the ones being generated by
+            somebody else, are returned in one piece. validators (see validators) are set
+            unless the previous version of the sitemap is returned.
+        """
+
+    def validators():
+        """ (ETag, Last-Modified time) of the generated sitemap, computed without generating it """
+
     def __call__():
         """Checks if the sitemap feature is enabled and returns it.
            It may returns a standard sitemap or an index of sitemaps when where are more than maxlen objects
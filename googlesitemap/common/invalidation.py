@@ -0,0 +1,275 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Per-shard invalidation of cached sitemaps.
+
+Content events are recorded in a persistent log of numbered changes. Each
+change carries the range of Date values it touched and whether it shifts
+the following sitemap entries (objects added, removed or becoming visible).
+
+Sitemaps are sorted by reverse Date, so a generated shard covers a window
+of dates: it is stale after a change touching its window or shifting the
+entries older than it. The sitemap index is stale only when entries are
+shifted or moved to a different Date.
+
+Changes without events aren't seen: items whose expiration date passes and
+changes of permissions made without events (local roles are notified on Plone
+4.1 and later). The sitemaps of anonymous users catch up on the next change
+or when their cached versions expire.
+"""
+
+import time
+import random
+
+from Acquisition import aq_base
+from DateTime import DateTime
+from persistent import Persistent
+from BTrees.OOBTree import OOBTree
+from BTrees.Length import Length
+from zope.annotation.interfaces import IAnnotations
+from zope.lifecycleevent.interfaces import IObjectAddedEvent
+from zope.lifecycleevent.interfaces import IObjectRemovedEvent
+
+from Products.CMFCore.utils import getToolByName
+
+from googlesitemap.common import config
+
+ANNOTATION_KEY = 'googlesitemap.common.changes'
+
+MAXDATE = float('inf')
+MINDATE = float('-inf')
+
+# window of a sitemap covering every item and of the sitemap index
+EVERYTHING = (MAXDATE, MINDATE)
+INDEX = None
+
+# changes are logged by (serial, nonce): concurrent transactions logging the
+# same serial add different keys, that BTrees merge without conflicts
+NONCES = 2 ** 31
+
+
+class SitemapChanges(Persistent):
+    """ The log of content changes relevant for sitemaps """
+
+    def __init__(self):
+        self.counter = Length()
+        # (serial, nonce) -> (newest, oldest, shift, time)
+        self.log = OOBTree()
+        # path -> Date of the objects we have seen, at most config.MAXDATES
+        self.dates = OOBTree()
+        self.size = Length()
+
+    def serial(self):
+        """ Serial number of the last change """
+        return self.counter()
+
+    def record(self, newest, oldest, shift):
+        """ Logs a change touching dates from newest to oldest """
+        self.counter.change(1)
+        serial = self.counter()
+        self.log[(serial, random.randrange(NONCES))] = (newest, oldest, shift, time.time())
+        # discarded in batches, not one by one with every change
+        if serial % max(1, config.MAXCHANGES // 100) == 0:
+            for key in list(self.log.keys(max=(serial - config.MAXCHANGES, NONCES))):
+                del self.log[key]
+
+    def _first(self):
+        """ Serial of the oldest change we have """
+        return self.log.minKey()[0]
+
+    def _last(self):
+        """ Serial of the newest change we have """
+        return self.log.maxKey()[0]
+
+    def _remember(self, path, date):
+        if path not in self.dates:
+            if self.size() >= config.MAXDATES:
+                self.dates = OOBTree()
+                self.size = Length()
+            self.size.change(1)
+        self.dates[path] = date
+
+    def _forget(self, path):
+        if path in self.dates:
+            del self.dates[path]
+            self.size.change(-1)
+
+    def added(self, path, date):
+        self._remember(path, date)
+        self.record(date, date, True)
+
+    def removed(self, path, date):
+        self._forget(path)
+        self.record(date, date, True)
+
+    def moved(self, oldpath, path, date):
+        self._forget(oldpath)
+        self._remember(path, date)
+        self.record(date, date, False)
+
+    def modified(self, path, date, shift=False):
+        """ Objects changing Date move between the two dates. We don't know where
+            objects never seen before were, the first change of them affects everything.
+        """
+        old = self.dates.get(path, None)
+        self._remember(path, date)
+        if old is None:
+            self.record(MAXDATE, MINDATE, True)
+        else:
+            self.record(max(old, date), min(old, date), shift)
+
+    def affects(self, serial, window):
+        """ True if a sitemap generated at serial covering window is stale """
+        if not self.log or serial >= self._last():
+            return False
+        if serial + 1 < self._first():
+            # changes already discarded
+            return True
+        for change in self.log.values(min=(serial + 1,)):
+            if _affects(change, window):
+                return True
+        return False
+
+    def lastchange(self, window):
+        """ (serial, time) of the last change affecting window, (0, None) if
+            there is none. Discarded changes are older than the ones we have.
+        """
+        if not self.log:
+            return 0, None
+        first = self._first()
+        for serial in xrange(self._last(), first - 1, -1):
+            for change in self.log.values(min=(serial,), max=(serial, NONCES)):
+                if _affects(change, window):
+                    return serial, change[3]
+        if first > 1:
+            return first - 1, self.log[self.log.minKey()][3]
+        return 0, None
+
+
+def _affects(change, window):
+    """ True if the logged change affects the sitemap covering window """
+    newest, oldest, shift = change[:3]
+    if window is INDEX:
+        return shift or newest != oldest
+    high, low = window
+    if shift and newest >= low:
+        return True
+    return oldest <= high and newest >= low
+
+
+def getChanges(context, create=False):
+    """ The changes log of the portal """
+    portal_url = getToolByName(context, 'portal_url', None)
+    if portal_url is None:
+        return None
+    annotations = IAnnotations(portal_url.getPortalObject(), None)
+    if annotations is None:
+        return None
+    changes = annotations.get(ANNOTATION_KEY, None)
+    if changes is None and create:
+        changes = annotations[ANNOTATION_KEY] = SitemapChanges()
+    return changes
+
+
+def token(portal):
+    """ The generation token of the portal: the serial of its last logged change.
+        It is read from the annotations of the portal without tools, adapters
+        or acquisition, so that it is cheap enough for every request.
+    """
+    annotations = getattr(aq_base(portal), '__annotations__', None)
+    if annotations is None:
+        return 0
+    changes = annotations.get(ANNOTATION_KEY, None)
+    if changes is None:
+        return 0
+    return changes.serial()
+
+
+# (site path/gzipname) -> (serial, window) of the sitemaps seen by this process,
+# at most config.MAXNAMES
+_generated = {}
+
+
+def validWindow(context, name, default=None):
+    """ The window of the sitemap called name seen by this process,
+        default if we don't know it or it is stale (the window of the
+        index is None too).
+    """
+    generated = _generated.get(name, None)
+    if generated is None:
+        return default
+    changes = getChanges(context)
+    serial, window = generated
+    if changes is not None and changes.affects(serial, window):
+        return default
+    return window
+
+
+def generated(name, serial, window):
+    """ Remembers the window of dates covered by a sitemap at serial """
+    remember(_generated, name, (serial, window))
+
+
+def remember(names, name, value):
+    """ names[name] = value, names are forgotten when they are too many """
+    if len(names) >= config.MAXNAMES and name not in names:
+        names.clear()
+    names[name] = value
+
+
+def dateOf(value):
+    """ Date value as a number """
+    return DateTime(value).timeTime()
+
+
+def _path(obj):
+    return '/'.join(obj.getPhysicalPath())
+
+
+def objectMoved(obj, event):
+    """ Objects added, removed or renamed """
+    changes = getChanges(obj, create=True)
+    if changes is None:
+        return
+    date = dateOf(obj.Date())
+    if IObjectRemovedEvent.providedBy(event):
+        changes.removed(_path(obj), date)
+    elif IObjectAddedEvent.providedBy(event):
+        changes.added(_path(obj), date)
+    else:
+        oldpath = '/'.join(event.oldParent.getPhysicalPath() + (event.oldName,))
+        changes.moved(oldpath, _path(obj), date)
+
+
+def objectModified(obj, event):
+    """ Objects edited """
+    changes = getChanges(obj, create=True)
+    if changes is not None:
+        changes.modified(_path(obj), dateOf(obj.Date()))
+
+
+def actionSucceeded(obj, event):
+    """ Workflow transitions may change who can see obj """
+    changes = getChanges(obj, create=True)
+    if changes is not None:
+        changes.modified(_path(obj), dateOf(obj.Date()), shift=True)
+
+
+def localrolesModified(obj, event):
+    """ Sharing may change who can see obj and the content it contains,
+        anywhere in the sitemaps
+    """
+    changes = getChanges(obj, create=True)
+    if changes is not None:
+        changes.record(MAXDATE, MINDATE, True)
@@ -0,0 +1,116 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Fast access to the catalog metadata used by sitemaps.
+
+brain.getURL() goes through REQUEST.physicalPathToURL for every brain and
+DateTime.HTML4() converts timezones for every date: with tens of thousands
+of brains they dominate the sitemap generation. The same goes for parsing
+the Date of every shard of a large sitemap index.
+"""
+
+import re
+import time
+from calendar import timegm
+from urllib import quote
+
+from DateTime import DateTime
+
+# formatted dates remembered, as many as the items of a sitemap
+MAXCACHED = 50000
+
+_lastmods = {}
+_isodates = {}
+
+# Date metadata already in ISO8601 format, with its offset
+_ISO8601 = re.compile(r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d[+-]\d\d:\d\d$')
+# Date metadata in the local time zone, as Date() of CMF returns it
+_NAIVE = re.compile(r'^(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)$')
+# DateTime 2.12 and later keep dates without a time zone naive, older ones
+# give them the local time zone
+_KEEPNAIVE = getattr(DateTime, 'timezoneNaive', None) is not None
+
+
+def lastmod(value):
+    """ The same of value.HTML4() (eg. '2010-12-14T10:53:21Z'), cached by second.
+        value is a DateTime or a number of seconds (see entries).
+    """
+    if not isinstance(value, (int, long, float)):
+        value = value.timeTime()
+    seconds = int(value)
+    formatted = _lastmods.get(seconds, None)
+    if formatted is None:
+        if len(_lastmods) >= MAXCACHED:
+            _lastmods.clear()
+        formatted = _lastmods[seconds] = time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                                       time.gmtime(seconds))
+    return formatted
+
+
+def _offset(seconds):
+    """ The offset of the local time zone at seconds, as ISO8601 has it """
+    minutes = int(round(seconds / 60.0))
+    sign = minutes < 0 and '-' or '+'
+    return '%s%02d:%02d' % (sign, abs(minutes) // 60, abs(minutes) % 60)
+
+
+def _iso8601(value):
+    """ DateTime(value).ISO8601() without parsing value with DateTime, when
+        it is a number or a Date string of the catalog
+    """
+    if isinstance(value, (int, long, float)):
+        local = time.localtime(value)
+        return time.strftime('%Y-%m-%dT%H:%M:%S', local) + _offset(timegm(local) - int(value))
+    if isinstance(value, basestring):
+        if _ISO8601.match(value):
+            return value
+        naive = _NAIVE.match(value)
+        if naive is not None:
+            if _KEEPNAIVE:
+                return value.replace(' ', 'T')
+            parts = tuple([int(part) for part in naive.groups()])
+            local = parts + (0, 0, -1)
+            return '%04d-%02d-%02dT%02d:%02d:%02d' % parts + _offset(
+                timegm(local) - time.mktime(local))
+    return DateTime(value).ISO8601()
+
+
+def iso8601(value):
+    """ The same of DateTime(value).ISO8601(), cached for Date strings """
+    if not isinstance(value, basestring):
+        return _iso8601(value)
+    formatted = _isodates.get(value, None)
+    if formatted is None:
+        if len(_isodates) >= MAXCACHED:
+            _isodates.clear()
+        formatted = _isodates[value] = _iso8601(value)
+    return formatted
+
+
+class URLResolver(object):
+    """ The url of brains from their path, resolving the portal url once """
+
+    def __init__(self, portal_path, portal_url):
+        self.portal_path = portal_path.rstrip('/')
+        self.prefixlen = len(self.portal_path)
+        self.portal_url = portal_url
+
+    def __call__(self, brain):
+        path = brain.getPath()
+        if path == self.portal_path:
+            return self.portal_url
+        if not path.startswith(self.portal_path + '/'):
+            # not below the portal, let the request tell
+            return brain.getURL()
+        return self.portal_url + quote(path[self.prefixlen:])
@@ -0,0 +1,106 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Sitemaps as plain xml.
+
+sitemap.xml and sitemap-recent.xml serve the same cached Gzipped sitemaps of
+the .gz views as xml documents: with Content-Encoding gzip to the clients
+accepting it, uncompressed on the fly for the others. Either way the sitemap
+is generated once.
+"""
+
+from plone.memoize.instance import memoize
+
+from googlesitemap.common import gzipstream
+from googlesitemap.common.sitemap import SiteMapCommonView
+from googlesitemap.common.sitemap import _etag
+from googlesitemap.common.recent import RecentSiteMapView
+
+
+def acceptsGzip(accept_encoding):
+    """ True if an Accept-Encoding header allows gzip """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        params = coding.split(';')
+        name = params[0].strip().lower()
+        quality = 1.0
+        for param in params[1:]:
+            key, sep, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name] = quality
+    for name in ('gzip', 'x-gzip', '*'):
+        if name in qualities:
+            return qualities[name] > 0
+    return False
+
+
+class PlainSiteMap(object):
+    """ Mixin serving a Gzipped sitemap view as xml """
+
+    @memoize
+    def gzipencoded(self):
+        """ True if the response is gzip encoded """
+        return acceptsGzip(self.request.get_header('Accept-Encoding', None) or '')
+
+    @property
+    def streaming(self):
+        # we can't uncompress what is being streamed
+        return super(PlainSiteMap, self).streaming and self.gzipencoded()
+
+    def validators(self):
+        etag, lastmodified = super(PlainSiteMap, self).validators()
+        return self._encodedetag(etag), lastmodified
+
+    def _filevalidators(self, path):
+        etag, lastmodified = super(PlainSiteMap, self)._filevalidators(path)
+        return self._encodedetag(etag), lastmodified
+
+    def _encodedetag(self, etag):
+        """ Encoded and uncompressed responses have different entity tags """
+        if self.gzipencoded():
+            return etag
+        return _etag(etag, 'identity')
+
+    def _setcontentheaders(self):
+        response = self.request.response
+        response.setHeader('Content-Type', 'text/xml; charset=utf-8')
+        response.setHeader('Vary', 'Accept-Encoding')
+        if self.gzipencoded():
+            response.setHeader('Content-Encoding', 'gzip')
+
+    def _body(self, data):
+        if self.gzipencoded() or not data:
+            return data
+        if not isinstance(data, str):
+            # a stored sitemap
+            try:
+                data = data.read()
+            finally:
+                data.close()
+        xml = gzipstream.decompress(data)
+        self.request.response.setHeader('Content-Length', len(xml))
+        return xml
+
+
+class PlainSiteMapView(PlainSiteMap, SiteMapCommonView):
+    """ sitemap.xml """
+
+
+class PlainRecentSiteMapView(PlainSiteMap, RecentSiteMapView):
+    """ sitemap-recent.xml """
@@ -0,0 +1,129 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Sitemap of the recently changed items.
+
+Crawlers can poll sitemap-recent.xml.gz for what changed in the last hours
+(?hours=6, default config.RECENT_HOURS) or since a date
+(?since=2012-05-04T12:00:00Z) instead of downloading whole shards again. They
+go back at most config.RECENT_MAX_HOURS hours.
+"""
+
+import time
+
+from DateTime import DateTime
+from zExceptions import BadRequest
+from zope.publisher.interfaces import NotFound
+
+try:
+    from zope.ramcache.ram import RAMCache
+except ImportError:
+    from zope.app.cache.ram import RAMCache
+
+from plone.memoize import ram
+from plone.memoize.instance import memoize
+
+from googlesitemap.common import config
+from googlesitemap.common import invalidation
+from googlesitemap.common.sitemap import SiteMapCommonView
+from googlesitemap.common.sitemap import _etag
+from googlesitemap.common.sitemap import _generationname
+
+_RECENT = '%s.generate' % __name__
+
+# recent sitemaps are small and short lived, they don't share the RAM cache
+_cache = RAMCache()
+_cache.update(maxEntries=100, maxAge=config.RECENT_TTL)
+
+
+def _recent_cachekey(self):
+    # Cache by the time span of the sitemap, for config.RECENT_TTL seconds
+    return '%s/%s/%d' % (_generationname(self), self.since(),
+                         time.time() // config.RECENT_TTL)
+
+
+def _recent_cache():
+    return ram.RAMCacheAdapter(_cache, globalkey=_RECENT)
+
+
+class RecentSiteMapView(SiteMapCommonView):
+    """ Sitemap of the items modified since a date or in the last hours """
+
+    streaming = False
+    store = None
+
+    @property
+    def filename(self):
+        return 'sitemap-recent.xml'
+
+    @memoize
+    def since(self):
+        """ Items modified after this time (in seconds) are listed, at most
+            config.RECENT_MAX_HOURS hours ago
+        """
+        now = time.time()
+        since = self.request.get('since', None)
+        if since:
+            try:
+                since = DateTime(since).timeTime()
+            except Exception:
+                raise BadRequest('Invalid since date: %s' % since)
+        else:
+            hours = self.request.get('hours', config.RECENT_HOURS)
+            try:
+                hours = float(hours)
+            except ValueError:
+                raise BadRequest('Invalid hours: %s' % hours)
+            if not hours >= 0:
+                raise BadRequest('Invalid hours: %s' % hours)
+            since = now - hours * 3600
+        since = max(since, now - config.RECENT_MAX_HOURS * 3600)
+        # rounded down, so that we may share the cache
+        return since - since % config.RECENT_TTL
+
+    @property
+    def query_dict(self):
+        return {'Language': 'all',
+                'modified': {'query': DateTime(self.since()), 'range': 'min'},
+                'sort_on': 'modified',
+                'sort_order': 'reverse',
+               }
+
+    def _sitemapwindow(self):
+        """ Just one sitemap, with the maxlen items modified last """
+        if self.index is not None:
+            raise NotFound(self.context, '%s-%s' % (self.index, self.filename), self.request)
+        return invalidation.EVERYTHING
+
+    def _chunks(self):
+        return self._render(), self._sitemapwindow()
+
+    def validators(self):
+        etag, lastmodified = super(RecentSiteMapView, self).validators()
+        return _etag(etag, self.since()), lastmodified
+
+    def generate(self):
+        """ Generates the Gzipped sitemap, cached for a few minutes """
+        if not self.anonymous_sitemap():
+            self.stats.cache = 'uncached'
+            return self._uncachedgenerate()
+        cache = _recent_cache()
+        key = _recent_cachekey(self)
+        data = cache.get(key, None)
+        if data is not None:
+            self.stats.cache = 'hit'
+            return data
+        self.stats.cache = 'miss'
+        data = cache[key] = self._uncachedgenerate()
+        return data
@@ -0,0 +1,375 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Regeneration of pre-generated sitemaps (see storage).
+
+Stale sitemaps are rebuilt by the @@sitemap-regenerate view, that can be
+called by cron or by a clock server, or by the sitemap-regenerate console
+script::
+
+    bin/sitemap-regenerate -C parts/instance/etc/zope.conf -u http://www.example.com /plone
+
+Stored sitemaps keep the urls of the request generating them and are served
+to everybody: the script needs the public url of the site (-u) and the view
+must be called through the public virtual host of the site, eg.
+http://localhost:8080/VirtualHostBase/http/www.example.com:80/plone/VirtualHostRoot/@@sitemap-regenerate
+
+The console script may spread the shards of large sites across worker
+processes (-j 4), each with its own ZODB connection. The files they write
+are the same the serial regeneration would write.
+
+Instances with many sites can regenerate all of them with the
+sitemap-regenerate-all console script, see batch.
+
+Sitemaps are always generated as the anonymous user.
+"""
+
+import os
+import sys
+import time
+from optparse import OptionParser
+from urlparse import urlparse
+
+import transaction
+from AccessControl.SecurityManagement import getSecurityManager
+from AccessControl.SecurityManagement import newSecurityManager
+from AccessControl.SecurityManagement import setSecurityManager
+from AccessControl.User import nobody
+from zExceptions import BadRequest
+from zope.component import getMultiAdapter
+from zope.interface import alsoProvides
+from ZPublisher.HTTPRequest import default_port
+
+from Products.Five import BrowserView
+
+from googlesitemap.common.interfaces import ISitemapLayer
+from googlesitemap.common import config
+from googlesitemap.common import invalidation
+from googlesitemap.common import storage
+
+
+class OutOfTime(Exception):
+    """ The regeneration of a site ran past its deadline. regenerated are the
+        names of the sitemaps rebuilt before, the others are still stale.
+    """
+
+    def __init__(self, regenerated):
+        Exception.__init__(self, '%d sitemaps regenerated' % len(regenerated))
+        self.regenerated = regenerated
+
+
+def _stale(store, changes, name, stored):
+    """ The sitemap called name needs to be rebuilt """
+    if stored is None:
+        return True
+    if not os.path.exists(store.path(name)):
+        return True
+    if changes is None:
+        return False
+    window = stored['window']
+    if window is not None:
+        window = tuple(window)
+    return changes.affects(stored['serial'], window)
+
+
+def _isshard(name, filename):
+    """ name is a shard or an index file of the sitemap called filename
+        (eg. 3-sitemap.xml or index1-sitemap.xml)
+    """
+    index, sep, rest = name.partition('-')
+    if index.startswith('index'):
+        index = index[len('index'):]
+    return sep and rest == filename and index.isdigit()
+
+
+def _sitemapview(site, name):
+    """ The sitemap view called name, set to the first sitemap """
+    request = site.REQUEST
+    if not ISitemapLayer.providedBy(request):
+        alsoProvides(request, ISitemapLayer)
+    view = getMultiAdapter((site, request), name=name)
+    view.index = view.part = None
+    return view
+
+
+def _write(view, store, mtime):
+    """ Stores the sitemap the view is set to (see index and part) without
+        recording it in the manifest, returns its name and window
+    """
+    gzipname = view.gzipname()
+    compressed, window = view._compressed(mtime)
+    store.writefile(gzipname, compressed)
+    return gzipname, window
+
+
+def regenerate(site, name=config.SITEMAPS[0], force=False, pool=None, mtime=None,
+               deadline=None):
+    """ Rebuilds the stale stored sitemaps of the view called name,
+        returns the names of the rebuilt sitemaps.
+        A WorkerPool generates them in parallel. mtime is the time written in
+        the gzip headers, the time of the call by default. Sitemaps generated
+        one at a time stop at deadline (a time.time() value) with OutOfTime,
+        after one at least. A pool doesn't stop: pass one of them.
+    """
+    if pool is not None and deadline is not None:
+        raise ValueError('Sitemaps generated by a pool have no deadline')
+    store = storage.getStore(site)
+    if store is None:
+        raise ValueError('No sitemaps directory configured')
+
+    changes = invalidation.getChanges(site)
+    serial = changes is not None and changes.serial() or 0
+    manifest = store.manifest()
+    if mtime is None:
+        # the same for every sitemap of the run, however they are generated
+        mtime = int(time.time())
+
+    security_manager = getSecurityManager()
+    newSecurityManager(None, nobody)
+    try:
+        view = _sitemapview(site, name)
+        len_brains = view._windowbrains()[1]
+        sitemaps = [(None, None)]
+        if len_brains >= view.maxlen:
+            shards, parts = view._shards(len_brains)
+            sitemaps.extend([(None, part) for part in range(1, parts)])
+            sitemaps.extend([(index, None) for index in range(shards)])
+
+        names = []
+        stale = []
+        for index, part in sitemaps:
+            view.index, view.part = index, part
+            gzipname = view.gzipname()
+            names.append(gzipname)
+            if force or _stale(store, changes, gzipname, manifest.get(gzipname)):
+                stale.append((index, part))
+
+        outoftime = False
+        if pool is not None and len(stale) > 1:
+            written = pool.generate(site, name, stale, mtime)
+        else:
+            written = []
+            for index, part in stale:
+                if deadline is not None and written and time.time() > deadline:
+                    outoftime = True
+                    break
+                view.index, view.part = index, part
+                written.append(_write(view, store, mtime))
+        if written:
+            store.update(dict([(written_name, (serial, window))
+                               for written_name, window in written]))
+        regenerated = [written_name for written_name, window in written]
+
+        # shards no longer needed
+        for gzipname in manifest.keys():
+            if gzipname not in names and _isshard(gzipname, view.filename):
+                store.remove(gzipname)
+        if outoftime:
+            raise OutOfTime(regenerated)
+    finally:
+        setSecurityManager(security_manager)
+    return regenerated
+
+
+def ispublic(url):
+    """ False for the urls of sites reached on their backend: hosts without a
+        domain (nohost, localhost, backend names), loopback and private addresses
+    """
+    hostname = (urlparse(url).hostname or '').lower()
+    if '.' not in hostname or hostname.endswith('.localhost'):
+        return False
+    parts = hostname.split('.')
+    if len(parts) == 4 and ''.join(parts).isdigit():
+        first, second = int(parts[0]), int(parts[1])
+        return not (first in (0, 10, 127) or
+                    (first, second) in ((169, 254), (192, 168)) or
+                    (first == 172 and 16 <= second < 32))
+    return True
+
+
+class RegenerateView(BrowserView):
+    """ Rebuilds the stale stored sitemaps of the site. Pass force=1 to rebuild them all
+        and name to choose the sitemap views (default config.SITEMAPS).
+        It must be called through the public virtual host of the site.
+    """
+
+    def __call__(self):
+        url = self.context.absolute_url()
+        if not ispublic(url):
+            raise BadRequest('%s is not a public url: call @@sitemap-regenerate through '
+                             'the public virtual host of the site' % url)
+        force = bool(self.request.get('force', False))
+        names = self.request.get('name', config.SITEMAPS)
+        if isinstance(names, basestring):
+            names = [names]
+
+        regenerated = []
+        for name in names:
+            regenerated.extend(regenerate(self.context, name, force))
+
+        self.request.response.setHeader('Content-Type', 'text/plain')
+        return '\n'.join(regenerated)
+
+
+def _batches(items, count):
+    """ items split in at most count contiguous batches of about the same size """
+    size, rest = divmod(len(items), count)
+    batches = []
+    start = 0
+    for i in range(count):
+        end = start + size + (i < rest and 1 or 0)
+        if end > start:
+            batches.append(items[start:end])
+        start = end
+    return batches
+
+
+def _initworker(config_file):
+    """ Configures Zope in a worker process """
+    import Zope2
+    Zope2.configure(config_file)
+
+
+def _generatebatch(args):
+    """ Generates a batch of sitemaps in a worker process, with its own
+        ZODB connection. Returns their names and windows.
+    """
+    path, url, name, sitemaps, mtime = args
+    app, site = _opensite(path, url)
+    try:
+        store = storage.getStore(site)
+        security_manager = getSecurityManager()
+        newSecurityManager(None, nobody)
+        try:
+            view = _sitemapview(site, name)
+            written = []
+            for index, part in sitemaps:
+                view.index, view.part = index, part
+                written.append(_write(view, store, mtime))
+            return written
+        finally:
+            setSecurityManager(security_manager)
+    finally:
+        transaction.abort()
+        app._p_jar.close()
+
+
+class WorkerPool(object):
+    """ Worker processes generating sitemaps in parallel, each with its own
+        ZODB connection. Create it before opening the database: workers are
+        forked and configure Zope on their own.
+    """
+
+    def __init__(self, config_file, jobs, url=None):
+        from multiprocessing import Pool
+        self.jobs = jobs
+        self.url = url
+        self.pool = Pool(jobs, _initworker, (config_file,))
+
+    def generate(self, site, name, sitemaps, mtime):
+        """ Generates and stores the sitemaps ((index, part) pairs) of the view
+            called name, returns their names and windows in the same order.
+            Contiguous shards go to the same worker, that sorts the brains once.
+        """
+        path = '/'.join(site.getPhysicalPath())
+        tasks = [(path, self.url, name, batch, mtime)
+                 for batch in _batches(sitemaps, self.jobs * 2)]
+        written = []
+        for result in self.pool.map(_generatebatch, tasks, 1):
+            written.extend(result)
+        return written
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+def _opensite(path, url=None):
+    """ A Zope application with a request and its site at path """
+    import Zope2
+    from Testing.makerequest import makerequest
+    try:
+        from zope.site.hooks import setSite
+    except ImportError:
+        from zope.app.component.hooks import setSite
+
+    app = makerequest(Zope2.app())
+    site = app.unrestrictedTraverse(path)
+    setSite(site)
+    if url:
+        _virtualhost(app.REQUEST, site, url)
+    return app, site
+
+
+def _virtualhost(request, site, url):
+    """ Generates urls of site as it was published at url """
+    scheme, netloc, path = urlparse(url)[:3]
+    hostname, sep, port = netloc.partition(':')
+    # without a port the request would keep its own
+    request.setServerURL(scheme, hostname, port or default_port[scheme])
+    request.other['VirtualRootPhysicalPath'] = site.getPhysicalPath()
+    request._script = [part for part in path.split('/') if part]
+
+
+def main(args=None):
+    """ The sitemap-regenerate console script """
+    parser = OptionParser(usage='%prog -C zope.conf [options] site_path...')
+    parser.add_option('-C', '--config', dest='config',
+                      help='the zope.conf of the instance')
+    parser.add_option('-n', '--name', dest='names', action='append',
+                      help='sitemap view to regenerate, may be repeated (default %s)' %
+                           ', '.join(config.SITEMAPS))
+    parser.add_option('-u', '--url', dest='url',
+                      help='public url of the site, required: stored sitemaps keep it')
+    parser.add_option('-f', '--force', dest='force', action='store_true', default=False,
+                      help='regenerate also sitemaps not changed')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1,
+                      help='worker processes generating the sitemaps (default 1)')
+    options, paths = parser.parse_args(args)
+    if not options.config or not paths:
+        parser.error('zope.conf and at least a site path are required')
+    if not options.url:
+        parser.error('the public url of the site (-u) is required')
+
+    pool = None
+    if options.jobs > 1:
+        # before opening the database
+        pool = WorkerPool(options.config, options.jobs, options.url)
+
+    import Zope2
+    Zope2.configure(options.config)
+    try:
+        for path in paths:
+            app, site = _opensite(path, options.url)
+            try:
+                for name in options.names or config.SITEMAPS:
+                    for gzipname in regenerate(site, name, options.force, pool):
+                        print '%s: %s' % (path, gzipname)
+            finally:
+                transaction.abort()
+                app._p_jar.close()
+    except:
+        if pool is not None:
+            pool.terminate()
+        raise
+    if pool is not None:
+        pool.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Sitemap serializers.
+
+They write the same markup produced by the sitemap.xml and sitemapindex.xml
+templates, without going through TAL.
+"""
+
+from cgi import escape
+
+URLSET_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+                 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                 'xsi:schemaLocation="http://www.sitemaps.org/schemas/sitemap/0.9'
+                 '                             '
+                 'http://www.sitemaps.org/schemas/sitemap/0.9/sitemap.xsd">\n\n')
+URLSET_FOOTER = '\n</urlset>\n'
+
+SITEMAPINDEX_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                       '<sitemapindex xmlns="http://www.sitemaps.org/it/schemas/sitemap/0.9">\n')
+SITEMAPINDEX_FOOTER = '</sitemapindex>\n'
+
+
+def text(value):
+    """ Escaped utf-8 text, the same way tal:content does """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif not isinstance(value, str):
+        value = str(value)
+    return escape(value)
+
+
+def url(obj):
+    """ A <url> fragment for an item yielded by objects() """
+    lastmod = obj['lastmod']
+    changefreq = obj.get('changefreq')
+    priority = obj.get('priority')
+
+    parts = ['\n    <url>\n        <loc>', text(obj['loc']), '</loc>\n        ']
+    if lastmod:
+        parts.extend(['<lastmod> ', text(lastmod), ' </lastmod>'])
+    parts.append('\n        ')
+    if changefreq:
+        parts.extend(['<changefreq>', text(changefreq), '</changefreq>'])
+    parts.append('\n        ')
+    if priority:
+        parts.extend(['<priority>', text(priority), '</priority>'])
+    parts.append('\n    </url>\n\n')
+    return ''.join(parts)
+
+
+def sitemap(item):
+    """ A <sitemap> fragment for an item yielded by sitemaps() """
+    return ('   <sitemap>\n      <loc>%s</loc>\n      <lastmod>%s</lastmod>\n'
+            '   </sitemap>\n' % (text(item['url']), text(item['maxdate'])))
+
+
+def urls(objects):
+    """ Yields the <url> fragments of the items yielded by objects() """
+    for obj in objects:
+        yield url(obj)
+
+
+def urlset(objects):
+    """ Yields the chunks of a <urlset> document """
+    yield URLSET_HEADER
+    for chunk in urls(objects):
+        yield chunk
+    yield URLSET_FOOTER
+
+
+def sitemapindex(sitemaps):
+    """ Yields the chunks of a <sitemapindex> document """
+    yield SITEMAPINDEX_HEADER
+    for item in sitemaps:
+        yield sitemap(item)
+    yield SITEMAPINDEX_FOOTER
@@ -13,35 +13,161 @@
 # Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
 # 02111-1307, USA.
 
-from gzip import GzipFile
-from cStringIO import StringIO
-
+import os
+import time
+import zlib
+from inspect import getmro
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
+
+from AccessControl import getSecurityManager
+from AccessControl.SecurityManagement import newSecurityManager
+from AccessControl.SecurityManagement import setSecurityManager
+from AccessControl.User import nobody
+from Acquisition import aq_base
 from DateTime import DateTime
 from zope.interface import implements
 from zope.component import getMultiAdapter
+from zope.component import queryUtility
 from zope.publisher.interfaces import NotFound
 
 from plone.memoize import ram
 from plone.memoize.instance import memoize
+from plone.memoize.interfaces import ICacheChooser
+
+from App.Common import rfc1123_date
+from ZPublisher.Iterators import filestream_iterator
 
 from Products.Five import BrowserView
 from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
 from Products.CMFCore.utils import getToolByName
 
 from googlesitemap.common.interfaces import ISiteMapView
+from googlesitemap.common.cache import getCache
+from googlesitemap.common.cache import getMemoryCache
+from googlesitemap.common.cache import threadLock
 from googlesitemap.common import config
+from googlesitemap.common import entries
+from googlesitemap.common import serializer
+from googlesitemap.common import stats
+from googlesitemap.common import gzipstream
+from googlesitemap.common import invalidation
+from googlesitemap.common import metadata
+from googlesitemap.common import storage
+from googlesitemap.common import variants
+
+
+def _generationname(self):
+    """ The name of the sitemap in the cache keys, its urls depend on the url
+        of the portal
+    """
+    # sitemap views are registered for the portal
+    return '%s/%s' % (self.context.absolute_url(), self.gzipname())
+
+
+def _changesname(self):
+    """ The name of the sitemap in the invalidation bookkeeping, the same for
+        every url of the portal
+    """
+    return '%s/%s' % ('/'.join(self.context.getPhysicalPath()), self.gzipname())
 
 
 def _render_defaultcachekey(fun, self):
-    # Cache by filename
-    mtool = getToolByName(self.context, 'portal_membership')
-    if not mtool.isAnonymousUser():
+    # Cache by sitemap name and by the last change affecting this sitemap,
+    # the same key in every process. See cache for the name@version format
+    if not self.anonymous_sitemap():
         raise ram.DontCache
 
-    url_tool = getToolByName(self.context, 'portal_url')
-    catalog = getToolByName(self.context, 'portal_catalog')
-    counter = catalog.getCounter()
-    return '%s/%s/%s/%s' % (url_tool(), self.filename, counter, str(self.index))
+    serial = self._lastchange()[0]
+    return '%s@%s' % (_generationname(self), serial)
+
+
+_GENERATE = '%s.generate' % __name__
+_BLOCKS = '%s.blocks' % __name__
+
+# sitemap name (see _generationname) -> cache key of its last version, see
+# stale_while_revalidate. At most config.MAXNAMES
+_latest = {}
+
+# sitemap path (see _changesname) -> (generation token of the portal,
+# (serial, time) of the last change affecting the sitemap), see _lastchange
+_lastchanges = {}
+_unknown = object()
+
+
+def _generatestorage(self):
+    """ The cache and the key used by generate """
+    key = '%s:%s' % (_GENERATE, _render_defaultcachekey(None, self))
+    shared = getCache()
+    if shared is not None:
+        return shared, key
+    memory = getMemoryCache()
+    if memory is not None:
+        return memory, key
+    chooser = queryUtility(ICacheChooser)
+    if chooser is not None:
+        return chooser(_GENERATE), key
+    return ram.RAMCacheAdapter(ram.global_cache, globalkey=_GENERATE), key
+
+
+def _generationlock(cache, key):
+    """ The lock held while the sitemap cached by key is generated """
+    if getattr(cache, 'lock', None) is not None:
+        return cache.lock(key)
+    return threadLock(key)
+
+
+class _Members(object):
+    """ The gzip members of the blocks of a sitemap by the digest of their
+        brains, sized in bytes for the memory cache
+    """
+
+    def __init__(self):
+        self.members = {}
+        self.size = 0
+
+    def get(self, digest):
+        return self.members.get(digest, None)
+
+    def add(self, digest, data):
+        self.members[digest] = data
+        self.size += len(data)
+
+    def __len__(self):
+        return self.size
+
+
+# blocks end after at most _MAXBLOCK times blocksize entries
+_MAXBLOCK = 8
+
+
+def _blocks(brains, blocksize):
+    """ brains split in blocks of about blocksize brains. Blocks end after the
+        brains whose path hashes to 0 modulo blocksize, wherever they are: an
+        added or removed brain changes just its block, not the following ones.
+    """
+    block = []
+    for brain in brains:
+        block.append(brain)
+        if (len(block) >= _MAXBLOCK * blocksize or
+                (zlib.crc32(brain.getPath()) & 0xffffffff) % blocksize == 0):
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _blockdigest(brains):
+    """ Digest of what the entries of brains are made of """
+    lastmod = metadata.lastmod
+    digest = md5()
+    for brain in brains:
+        digest.update('%s %s %s\n' % (brain.getPath(), lastmod(brain.modified),
+                                      brain.portal_type))
+    return digest.hexdigest()
 
 
 class SiteMapCommonView(BrowserView):
@@ -50,16 +176,70 @@ class SiteMapCommonView(BrowserView):
 
     template = ViewPageTemplateFile('sitemap.xml')
     indextemplate = ViewPageTemplateFile('sitemapindex.xml')
+    # set it to True if you customize template or indextemplate
+    use_template = False
+    # portal_type -> producer of the entries of its items, merged with the
+    # ones of the base classes (see variants)
+    urlvariants = variants.URLVARIANTS
+    # producer of the entries of the other types
+    defaultvariants = variants.DEFAULT
+    # read the sitemap of anonymous users from the entry store, when it has
+    # been built and query_dict is the standard one (see entries)
+    use_entries = True
 
     def __init__(self, context, request):
         self.context = context
         self.request = request
         self.index = getattr(self.request, 'index', None)
+        # sitemap index file, when there are more than maxshards shards
+        self.part = getattr(self.request, 'part', None)
+        self.catalog_queries = 0
+        self._brains = {}
+        # True when generate returned the previous version of the sitemap
+        self.stale = False
+        # timings and counters of this request, see stats
+        self.stats = stats.GenerationStats()
 
     @property
     def maxlen(self):
         return config.MAXLEN
 
+    @property
+    def maxshards(self):
+        return config.MAXSHARDS
+
+    @property
+    def anonymous_query(self):
+        return config.ANONYMOUS_QUERY
+
+    @property
+    def compresslevel(self):
+        return config.COMPRESSLEVEL
+
+    @property
+    def streaming(self):
+        return config.STREAMING
+
+    @property
+    def conditional(self):
+        return config.CONDITIONAL
+
+    @property
+    def stale_while_revalidate(self):
+        return config.STALE_WHILE_REVALIDATE
+
+    @property
+    def cache_control(self):
+        return config.CACHE_CONTROL
+
+    @property
+    def blocksize(self):
+        return config.BLOCKSIZE
+
+    @property
+    def store(self):
+        return storage.getStore(self.context)
+
     @property
     def query_dict(self):
         return {'Language': 'all', 
@@ -73,116 +253,562 @@ class SiteMapCommonView(BrowserView):
 
     @property
     def enable_sitemap(self):
-        sp = getToolByName(self.context, 'portal_properties').site_properties
+        # the tools of the portal are its attributes, no need to acquire them
+        sp = aq_base(self.context).portal_properties.site_properties
         return sp.enable_sitemap
 
     @memoize
     def portal_url(self):
         return getMultiAdapter((self.context, self.request), name=u"plone_portal_state").portal_url()
 
+    def _shards(self, len_brains):
+        """ Number of shards and of sitemap index files for len_brains items """
+        shards = (len_brains - 1) / self.maxlen + 1
+        return shards, (shards - 1) / self.maxshards + 1
+
     def sitemaps(self):
-        """ Get sitemaps data when using indexes of sitemaps """
-        for current in enumerate(self._catalogbrains()[0::self.maxlen]):
-            index = current[0]
-            item = current[1]
-           
-            maxdate = DateTime(item.Date).ISO8601()
+        """ Get sitemaps data when using indexes of sitemaps.
+            Only the first brain of each shard is loaded.
+        """
+        brains, len_brains = self._searchbrains()
+        shards = self._shards(len_brains)[0]
+        first = self._partnumber() * self.maxshards
+        for index in xrange(first, min(first + self.maxshards, shards)):
+            item = brains[index * self.maxlen]
+
+            maxdate = metadata.iso8601(item.Date)
             url = '%s/%s?index=%d' % (self.portal_url(), self.filename, index)
             yield {'maxdate':maxdate, 'url':url}
 
-# TODO: re-enable memoize without breaking tests
-#    @memoize
+    def _indexnumber(self):
+        """ The shard requested, None when no index is specified """
+        if self.index is None:
+            return None
+        try:
+            index = int(self.index)
+        except (TypeError, ValueError):
+            index = -1
+        if index < 0:
+            raise NotFound(self.context, '%s-%s' % (self.index, self.filename), self.request)
+        return index
+
+    def _partnumber(self):
+        """ The sitemap index file requested, 0 is the first one """
+        try:
+            part = int(self.part or 0)
+        except (TypeError, ValueError):
+            part = -1
+        if part < 0:
+            raise NotFound(self.context, self.filename, self.request)
+        return part
+
+    def indexes(self):
+        """ Urls of the sitemap index files, more than one when there are more
+            than maxshards shards
+        """
+        len_brains = self._windowbrains()[1]
+        url = '%s/%s' % (self.portal_url(), self.filename)
+        if len_brains < self.maxlen:
+            return [url]
+        parts = self._shards(len_brains)[1]
+        return [url] + ['%s?part=%d' % (url, part) for part in range(1, parts)]
+
+    def anonymous_sitemap(self):
+        """ True if the current user gets the sitemap of anonymous users """
+        if self.anonymous_query:
+            return True
+        # what portal_membership.isAnonymousUser does, without looking it up
+        user = getSecurityManager().getUser()
+        return user is None or user.getUserName() == 'Anonymous User'
+
+    def _searchuser(self):
+        """ The user whose brains are searched, None for anonymous_query """
+        if self.anonymous_query:
+            return None
+        return getSecurityManager().getUser().getId()
+
+    def _searchcatalog(self, **query):
+        """ Catalog search, counted in catalog_queries """
+        self.catalog_queries += 1
+        catalog = getToolByName(self.context, 'portal_catalog')
+        self.stats.start('query')
+        try:
+            if not self.anonymous_query:
+                return catalog.searchResults(**query)
+            # search what anonymous users can see, whoever we are
+            security_manager = getSecurityManager()
+            newSecurityManager(None, nobody)
+            try:
+                return catalog.searchResults(**query)
+            finally:
+                setSecurityManager(security_manager)
+        finally:
+            self.stats.stop()
+
+    def _searchbrains(self, end=None):
+        """ Brains sorted by the catalog, all of them or just the first end ones,
+            and the number of all brains.
+            Brains are searched once per view and user: the same view may be used
+            by different users (eg. the regeneration of stored sitemaps or tests).
+        """
+        key = (self._searchuser(), self.maxlen, end)
+        if key not in self._brains:
+            stored = self._storedentries()
+            if stored is not None:
+                # already sorted, windows are read from it
+                brains, count = stored, len(stored)
+            elif end is None:
+                brains = self._searchcatalog(**self.query_dict)
+                count = len(brains)
+            else:
+                # counting is cheap, the catalog doesn't sort anything
+                query = dict(self.query_dict)
+                for name in ('sort_on', 'sort_order'):
+                    query.pop(name, None)
+                count = len(self._searchcatalog(**query))
+                if end * config.SORT_LIMIT_RATIO > count:
+                    # partial sorts of large windows are slower than sorting everything
+                    brains = self._searchbrains()[0]
+                else:
+                    query = dict(self.query_dict)
+                    query['sort_limit'] = end
+                    brains = self._searchcatalog(**query)
+            self._brains[key] = (brains, count)
+        return self._brains[key]
+
+    def _storedentries(self):
+        """ The entries of the entry store visible to anonymous users, None when
+            they have to be searched in the catalog
+        """
+        if not self.use_entries or self._searchuser() is not None:
+            return None
+        if self.query_dict != entries.QUERY or not self._stockentries():
+            return None
+        store = entries.entriesOf(self.context)
+        if store is None:
+            return None
+        self.stats.start('query')
+        try:
+            return store.visible()
+        finally:
+            self.stats.stop()
+
     def _catalogbrains(self):
-        """Returns the data to create the sitemap. Max items = 1000 * maxlen using sitemap indexes.
+        """Returns the data to create the sitemap.
            maxlen depends on the specific sitemap (standard sitemap, video, news, etc).
         """
-        catalog = getToolByName(self.context, 'portal_catalog')
-        return catalog.searchResults(**self.query_dict)[:self.maxlen*1000]
+        return self._searchbrains()[0]
+
+    def _windowbrains(self):
+        """ The brains of the current window and the number of all brains.
+            When the window is small compared to all brains the catalog sorts only
+            the brains up to the end of the window (sort_limit).
+        """
+        start, end = self.getStartEnd()
+        if start is None:
+            start, end = 0, self.maxlen
+        if (self._searchuser(), self.maxlen, None) in self._brains:
+            # all brains already sorted
+            brains, count = self._searchbrains()
+        else:
+            brains, count = self._searchbrains(end)
+        return brains[start:end], count
 
     def getStartEnd(self):
         """ Get window slice of brains """
         start = None
         end = None
         if self.index is not None:
-            start = int(self.index)*self.maxlen
+            start = self._indexnumber()*self.maxlen
             end = start + self.maxlen
         return (start, end)
 
     def _slicecatalogbrains(self):
         """ Get the right window of brains """
+        return self._windowbrains()[0]
+
+
+    def _window(self, len_brains):
+        """ Dates of the first and the last item of the current window of brains """
         start, end = self.getStartEnd()
-        if start is not None and end is not None:
-            catalog_brains = self._catalogbrains()[start:end]
+        brains = self._windowbrains()[0]
+        high = invalidation.dateOf(brains[0].Date)
+        if end >= len_brains:
+            # items older than the last one would be added here
+            low = float('-inf')
         else:
-            catalog_brains = self._catalogbrains()
-        return catalog_brains
+            low = invalidation.dateOf(brains[-1].Date)
+        return (high, low)
+
+    def urlresolver(self):
+        """ Returns a brain -> url callable, equivalent to brain.getURL() """
+        return metadata.URLResolver('/'.join(self.context.getPhysicalPath()),
+                                    self.portal_url())
 
+    @memoize
+    def _urlvariants(self):
+        """ portal_type -> entries producer, the urlvariants of the class and
+            of its bases
+        """
+        resolved = {}
+        for klass in reversed(getmro(self.__class__)):
+            resolved.update(klass.__dict__.get('urlvariants', {}))
+        return resolved
 
     def objects(self):
         """Returns the data to create the sitemap."""
-        catalog_brains = self._slicecatalogbrains()
+        return self._objects(self._slicecatalogbrains())
+
+    def _objects(self, catalog_brains):
+        """ The entries of catalog_brains """
+        url = self.urlresolver()
+        lastmod = metadata.lastmod
+        producers = self._urlvariants().get
+        default = self.defaultvariants
+        if getattr(default, 'plain', False):
+            # written inline below
+            default = None
 
         for item in catalog_brains:
-            if item.portal_type in ['Image']:
-                yield {
-                    'loc': '%s/view' % item.getURL(),
-                    'lastmod': item.modified.HTML4(),
-                    #'changefreq': 'always', # hourly/daily/weekly/monthly/yearly/never
-                    #'prioriy': 0.5, # 0.0 to 1.0
-                }
-            else:
-                if item.portal_type in ['File']:
-                    yield {
-                        'loc': '%s/view' % item.getURL(),
-                        'lastmod': item.modified.HTML4(),
-                        #'changefreq': 'always', # hourly/daily/weekly/monthly/yearly/never
-                        #'prioriy': 0.5, # 0.0 to 1.0
-                    }
-                yield {
-                    'loc': item.getURL(),
-                    'lastmod': item.modified.HTML4(),
-                    #'changefreq': 'always', # hourly/daily/weekly/monthly/yearly/never
-                    #'prioriy': 0.5, # 0.0 to 1.0
-                }
+            producer = producers(item.portal_type, default)
+            if producer is None:
+                yield {'loc': url(item), 'lastmod': lastmod(item.modified)}
+                continue
+            # changefreq: always/hourly/daily/weekly/monthly/yearly/never,
+            # priority: 0.0 to 1.0, see variants
+            for entry in producer(item, url(item), lastmod(item.modified)):
+                yield entry
+
+    def _render(self):
+        """ Sitemap xml chunks """
+        if self.use_template:
+            chunks = [self.template().encode('utf-8')]
+        else:
+            objects = self.stats.timed('objects', self.objects(), 'entries')
+            chunks = serializer.urlset(objects)
+        return self.stats.timed('render', chunks, 'bytes_in', len)
+
+    def _renderindex(self):
+        """ Sitemap index xml chunks """
+        if self.use_template:
+            chunks = [self.indextemplate().encode('utf-8')]
+        else:
+            sitemaps = self.stats.timed('objects', self.sitemaps(), 'entries')
+            chunks = serializer.sitemapindex(sitemaps)
+        return self.stats.timed('render', chunks, 'bytes_in', len)
 
-    def _uncachedgenerate(self):
-        """ Generates the Gzipped sitemap uncached data """
-        len_brains = len(self._catalogbrains())
+    def _sitemapwindow(self):
+        """ The window of dates covered by the sitemap """
+        len_brains = self._windowbrains()[1]
 
         if self.index is None:
             # no index specified in the url
             if len_brains < self.maxlen:
                 # ok, we have few items, let's generate the standard sitemap
-                xml = self.template()
-            else:
-                # a lot of items, let's generate a sitemap index
-                xml = self.indextemplate()
-        elif int(self.index)*self.maxlen >= len_brains:
+                return invalidation.EVERYTHING
+            # a lot of items, let's generate a sitemap index
+            if self._partnumber() >= self._shards(len_brains)[1]:
+                # bad sitemap index file
+                raise NotFound(self.context, self.gzipname(), self.request)
+            return invalidation.INDEX
+        elif self._indexnumber()*self.maxlen >= len_brains:
             # bad index specified
             raise NotFound(self.context, '%s-%s' % (self.index, self.filename), self.request)
+        # index specified in the url
+        return self._window(len_brains)
+
+    def _chunks(self):
+        """ Sitemap xml chunks and the window of dates they cover """
+        window = self._sitemapwindow()
+        if window is invalidation.INDEX:
+            chunks = self._renderindex()
         else:
-            # index specified in the url
-            xml = self.template()
+            chunks = self._render()
+        return chunks, window
 
+    def gzipname(self):
+        """ Name of the file inside the Gzipped sitemap """
         if self.index is not None:
-            filename = "%s-%s" % (self.index, self.filename)
-        else:
-            filename = self.filename
-
-        fp = StringIO()
-        gzip = GzipFile(filename, 'w', 9, fp)
-        gzip.write(xml)
-        gzip.close()
-        data = fp.getvalue()
-        fp.close()
-        return data
+            return "%d-%s" % (self._indexnumber(), self.filename)
+        part = self._partnumber()
+        if part:
+            return "index%d-%s" % (part, self.filename)
+        return self.filename
+
+    def _gzipchunks(self):
+        """ Gzipped sitemap data, yielded while it is generated """
+        return self._compressed()[0]
+
+    def _compressed(self, mtime=None):
+        """ Gzipped sitemap data, yielded while it is generated, and the window of
+            dates it covers. mtime is the time written in the gzip header.
+        """
+        if self._useblocks():
+            window = self._sitemapwindow()
+            if window is not invalidation.INDEX:
+                compressed = self._gzipblocks(mtime)
+                return self.stats.timed('compress', compressed, 'bytes_out', len), window
+        chunks, window = self._chunks()
+        compressed = gzipstream.compress(chunks, self.gzipname(), self.compresslevel,
+                                         config.CHUNKSIZE, mtime)
+        return self.stats.timed('compress', compressed, 'bytes_out', len), window
+
+    def _stockobjects(self):
+        """ True if the entries are written by objects() of this class """
+        objects = getattr(self.objects, 'im_func', None)
+        return objects is SiteMapCommonView.objects.im_func
+
+    def _stockentries(self):
+        """ True if the sitemaps need just the brain metadata stored in the entry
+            store: objects() and sitemaps() of this class and URLVariants producers
+        """
+        sitemaps = getattr(self.sitemaps, 'im_func', None)
+        if not self._stockobjects() or sitemaps is not SiteMapCommonView.sitemaps.im_func:
+            return False
+        producers = self._urlvariants().values() + [self.defaultvariants]
+        for producer in producers:
+            if not isinstance(producer, variants.URLVariants):
+                return False
+        return True
+
+    def _useblocks(self):
+        """ True if sitemaps are compressed a block of entries at a time. Views
+            writing their entries on their own (templates, objects()) aren't.
+        """
+        if not self.blocksize or self.use_template:
+            return False
+        return self._stockobjects()
+
+    def _gzipblocks(self, mtime=None):
+        """ Gzipped sitemap data as a gzip member for each block of about
+            blocksize entries (see _blocks), after a member with the header.
+            The members of the blocks compressed the last time are reused when
+            their brains are the same.
+        """
+        memory = getMemoryCache()
+        previous = None
+        if memory is not None:
+            key = '%s:%s@0' % (_BLOCKS, _generationname(self))
+            previous = memory.get(key, None)
+        if previous is None:
+            previous = _Members()
+        members = _Members()
+
+        self.stats.incr('bytes_in', len(serializer.URLSET_HEADER + serializer.URLSET_FOOTER))
+        yield gzipstream.member(serializer.URLSET_HEADER, self.gzipname(),
+                                self.compresslevel, mtime)
+        for block in _blocks(self._slicecatalogbrains(), self.blocksize):
+            digest = _blockdigest(block)
+            data = previous.get(digest)
+            if data is None:
+                objects = self.stats.timed('objects', self._objects(block), 'entries')
+                chunks = self.stats.timed('render', serializer.urls(objects), 'bytes_in', len)
+                data = gzipstream.member(''.join(chunks), level=self.compresslevel)
+            else:
+                self.stats.incr('blocks_reused')
+            members.add(digest, data)
+            yield data
+        yield gzipstream.member(serializer.URLSET_FOOTER, level=self.compresslevel)
+
+        if memory is not None:
+            memory[key] = members
+
+    def _uncachedgenerate(self):
+        """ Generates the Gzipped sitemap uncached data """
+        return ''.join(self._gzipchunks())
 
-    @ram.cache(_render_defaultcachekey)
     def generate(self):
         """ Generates the cached Gzipped sitemap.
             Override just this method for change caching policy
         """
-        return self._uncachedgenerate()
+        try:
+            cache, key = _generatestorage(self)
+        except ram.DontCache:
+            self.stats.cache = 'uncached'
+            return self._uncachedgenerate()
+
+        name = _generationname(self)
+        data = cache.get(key, None)
+        if data is not None:
+            self.stats.cache = 'hit'
+            invalidation.remember(_latest, name, key)
+            return data
+
+        # only one thread (or process) generates the same sitemap
+        lock = _generationlock(cache, key)
+        stale = None
+        previous = _latest.get(name, None)
+        if self.stale_while_revalidate and previous not in (None, key):
+            stale = cache.get(previous, None)
+        if stale is None:
+            lock.acquire()
+        elif not lock.acquire(False):
+            # being generated, the previous version will do meanwhile
+            self.stale = True
+            self.stats.cache = 'stale'
+            return stale
+        try:
+            data = cache.get(key, None)
+            if data is None:
+                self.stats.cache = 'miss'
+                data = cache[key] = self._uncachedgenerate()
+            else:
+                # generated by somebody else meanwhile
+                self.stats.cache = 'hit'
+            invalidation.remember(_latest, name, key)
+        finally:
+            lock.release()
+        return data
+
+    def stream(self, validators=None):
+        """ Writes the Gzipped sitemap to the response while it is generated.
+            Cached sitemaps are returned as they are, and so are the ones being
+            generated by somebody else (see generate). validators are set
+            unless the previous version of the sitemap is returned.
+        """
+        try:
+            cache, key = _generatestorage(self)
+        except ram.DontCache:
+            self.stats.cache = 'uncached'
+            self._setvalidators(validators)
+            return self._writechunks(self._gzipchunks())
+
+        name = _generationname(self)
+        cached = cache.get(key, None)
+        if cached is None:
+            # only one thread (or process) generates the same sitemap
+            lock = _generationlock(cache, key)
+            if not lock.acquire(False):
+                data = self.generate()
+                if not self.stale:
+                    self._setvalidators(validators)
+                return data
+            try:
+                cached = cache.get(key, None)
+                if cached is None:
+                    self.stats.cache = 'miss'
+                    self._setvalidators(validators)
+                    data = []
+                    self._writechunks(self._gzipchunks(), data)
+                    cache[key] = ''.join(data)
+                    invalidation.remember(_latest, name, key)
+                    return ''
+            finally:
+                lock.release()
+        self.stats.cache = 'hit'
+        self._setvalidators(validators)
+        invalidation.remember(_latest, name, key)
+        return cached
+
+    def _writechunks(self, chunks, data=None):
+        """ Writes chunks to the response, and appends them to data """
+        response = self.request.response
+        for chunk in chunks:
+            response.write(chunk)
+            if data is not None:
+                data.append(chunk)
+        return ''
+
+    def _lastchange(self):
+        """ (serial, time) of the last change affecting the anonymous sitemap,
+            or the newest Date of its items if no logged change does.
+            It is computed once per generation token of the portal: until the
+            next change cache keys and validators cost a dictionary lookup.
+        """
+        name = _changesname(self)
+        token = invalidation.token(self.context)
+        version = _lastchanges.get(name, None)
+        if version is not None and version[0] == token:
+            return version[1]
+
+        # validWindow scans the changes logged after the last one we remembered:
+        # if none of them affects the sitemap that one still is the last
+        window = invalidation.validWindow(self.context, name, _unknown)
+        if window is not _unknown and version is not None:
+            invalidation.remember(_lastchanges, name, (token, version[1]))
+            return version[1]
+        if window is _unknown:
+            window = self._sitemapwindow()
+        changes = invalidation.getChanges(self.context)
+        if changes is None:
+            serial, when = 0, None
+        else:
+            serial, when = changes.lastchange(window)
+        if when is None:
+            # nothing changed since we log changes, the newest Date will do
+            brains = self._windowbrains()[0]
+            if brains:
+                when = min(invalidation.dateOf(brains[0].Date), time.time())
+        # remember the window, see invalidation
+        invalidation.generated(name, serial, window)
+        invalidation.remember(_lastchanges, name, (token, (serial, when)))
+        return serial, when
+
+    def validators(self):
+        """ (ETag, Last-Modified time) of the generated sitemap, computed from
+            the changes log without generating it
+        """
+        serial, when = self._lastchange()
+        return _etag(_generationname(self), serial), when
+
+    def _setvalidators(self, validators):
+        """ Sets the ETag and Last-Modified headers """
+        if validators is None:
+            return
+        etag, lastmodified = validators
+        response = self.request.response
+        response.setHeader('ETag', etag)
+        if lastmodified is not None:
+            response.setHeader('Last-Modified', rfc1123_date(lastmodified))
+
+    def _notmodified(self, etag, lastmodified):
+        """ True if the client has the current sitemap """
+        response = self.request.response
+        if_none_match = self.request.get_header('If-None-Match', None)
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            matches = '*' in tags or etag in tags or 'W/%s' % etag in tags
+        else:
+            if_modified_since = self.request.get_header('If-Modified-Since', None)
+            if not if_modified_since or lastmodified is None:
+                return False
+            try:
+                since = DateTime(if_modified_since.split(';')[0]).timeTime()
+            except Exception:
+                return False
+            matches = int(lastmodified) <= since
+        if matches:
+            response.setStatus(304)
+        return matches
+
+    def _stored(self):
+        """ The pre-generated sitemap file, if any """
+        self._indexnumber()
+        path = self.store.path(self.gzipname())
+        if not os.path.exists(path):
+            return None
+        if self.conditional:
+            validators = self._filevalidators(path)
+            self._setvalidators(validators)
+            if self._notmodified(*validators):
+                return ''
+        self.request.response.setHeader('Content-Length', os.path.getsize(path))
+        return filestream_iterator(path, 'rb')
+
+    def _filevalidators(self, path):
+        """ (ETag, Last-Modified time) of a pre-generated sitemap """
+        stat = os.stat(path)
+        return _etag(path, stat.st_mtime, stat.st_size), stat.st_mtime
+
+    def _setcontentheaders(self):
+        """ Content-Type (and Content-Encoding) of the response """
+        self.request.response.setHeader('Content-Type', 'application/octet-stream')
+
+    def _body(self, data):
+        """ The response body out of the Gzipped sitemap, a string or a file
+            iterator. Variants of the sitemap (see plain) override it.
+        """
+        return data
 
     def __call__(self):
         """Checks if the sitemap feature is enabled and returns it."""
@@ -190,8 +816,44 @@ class SiteMapCommonView(BrowserView):
             # sitemap enabled
             raise NotFound(self.context, '%s' % self.filename, self.request)
 
-        self.request.response.setHeader('Content-Type',
-                                        'application/octet-stream')
-        return self.generate()
-
-
+        response = self.request.response
+        self._setcontentheaders()
+        anonymous = self.anonymous_sitemap()
+        if anonymous and self.cache_control:
+            response.setHeader('Cache-Control', self.cache_control)
+
+        if self.store is not None:
+            stored = self._stored()
+            if stored is not None:
+                self._record('stored')
+                return self._body(stored)
+        # authenticated users see content whose visibility we don't track
+        validators = None
+        if anonymous and self.conditional:
+            validators = self.validators()
+            if self._notmodified(*validators):
+                self._setvalidators(validators)
+                self._record('notmodified')
+                return ''
+        if self.streaming:
+            # headers are sent with the first chunk
+            data = self.stream(validators)
+        else:
+            data = self.generate()
+            if not self.stale:
+                self._setvalidators(validators)
+        self._record()
+        return self._body(data)
+
+    def _record(self, cache=None):
+        """ Records the stats of the request, see stats """
+        if cache is not None:
+            self.stats.cache = cache
+        self.stats.name = _generationname(self)
+        self.stats.incr('catalog_queries', self.catalog_queries)
+        stats.record(self.stats)
+
+
+def _etag(*values):
+    """ A strong entity tag for values """
+    return '"%s"' % md5('/'.join([str(value) for value in values])).hexdigest()
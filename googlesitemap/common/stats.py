@@ -0,0 +1,214 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Timings and counters of sitemap generations.
+
+Every sitemap request collects the time spent in each phase (catalog query,
+brains to entries, xml rendering, gzip compression) and counts the entries
+and the bytes before and after compression, plus how the cache answered. The stats
+are logged, the latest ones are listed by the @@sitemap-stats view and, if
+configured, they are sent to statsd::
+
+    <product-config googlesitemap.common>
+        statsd localhost:8125
+    </product-config>
+"""
+
+import time
+import socket
+import logging
+import threading
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from Products.Five import BrowserView
+
+from googlesitemap.common import config
+from googlesitemap.common import storage
+from googlesitemap.common.cache import getMemoryCache
+
+logger = logging.getLogger('googlesitemap.common')
+
+# phases, in the order they are reported: catalog query, brains to entries
+# (objects or sitemaps), xml serialization and gzip compression
+PHASES = ('query', 'objects', 'render', 'compress')
+
+# the latest stats, newest last, see recent()
+_recent = []
+_recentlock = threading.Lock()
+
+
+class GenerationStats(object):
+    """ Timings and counters of a sitemap request.
+        Timings are exclusive: the time spent in a phase running inside
+        another one (eg. objects inside render) is not counted twice.
+    """
+
+    def __init__(self):
+        self.name = None
+        self.started = time.time()
+        # how the sitemap was found: 'hit', 'miss', 'stale', 'uncached' (not
+        # cacheable), 'stored' (pre-generated) or 'notmodified' (304)
+        self.cache = None
+        self.timings = dict([(phase, 0.0) for phase in PHASES])
+        self.counters = {'entries': 0, 'bytes_in': 0, 'bytes_out': 0}
+        self._running = []
+
+    def start(self, phase):
+        """ phase starts, the running phase (if any) is paused """
+        now = time.time()
+        if self._running:
+            outer, started = self._running[-1]
+            self.timings[outer] += now - started
+        self._running.append([phase, now])
+
+    def stop(self):
+        """ The running phase stops, the outer one (if any) goes on """
+        now = time.time()
+        phase, started = self._running.pop()
+        self.timings[phase] = self.timings.get(phase, 0.0) + now - started
+        if self._running:
+            self._running[-1][1] = now
+
+    def incr(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def timed(self, phase, iterable, counter=None, measure=None):
+        """ Yields the items of iterable, timing their production as phase.
+            Every item adds measure(item) (or 1) to counter.
+        """
+        iterator = iter(iterable)
+        while True:
+            self.start(phase)
+            try:
+                item = iterator.next()
+            except StopIteration:
+                self.stop()
+                return
+            except:
+                self.stop()
+                raise
+            self.stop()
+            if counter is not None:
+                if measure is None:
+                    self.incr(counter)
+                else:
+                    self.incr(counter, measure(item))
+            yield item
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def summary(self):
+        """ The stats as a dictionary, times in milliseconds """
+        data = {'name': self.name,
+                'time': self.started,
+                'cache': self.cache,
+                'total': round(self.elapsed() * 1000, 3)}
+        for phase, seconds in self.timings.items():
+            data[phase] = round(seconds * 1000, 3)
+        data.update(self.counters)
+        return data
+
+    def __str__(self):
+        parts = ['%s: cache %s, %.1f ms' % (self.name, self.cache, self.elapsed() * 1000)]
+        parts.extend(['%s %.1f ms' % (phase, self.timings[phase] * 1000) for phase in PHASES])
+        parts.extend(['%s %d' % (counter, value)
+                      for counter, value in sorted(self.counters.items())])
+        return ', '.join(parts)
+
+
+def record(stats):
+    """ Logs the stats of a request, keeps them for recent() and sends them
+        to statsd
+    """
+    # formatted only if logged
+    if stats.cache in ('miss', 'uncached'):
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('%s', stats)
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug('%s', stats)
+
+    _recentlock.acquire()
+    try:
+        _recent.append(stats.summary())
+        del _recent[:-config.STATS_RECENT]
+    finally:
+        _recentlock.release()
+
+    address = getStatsd()
+    if address is not None:
+        send(address, metrics(stats))
+
+
+def recent():
+    """ Summaries of the latest stats, newest first """
+    _recentlock.acquire()
+    try:
+        latest = list(_recent)
+    finally:
+        _recentlock.release()
+    latest.reverse()
+    return latest
+
+
+def getStatsd():
+    """ (host, port) of the configured statsd, None if not configured """
+    address = storage.getProductConfig('statsd', config.STATSD)
+    if not address:
+        return None
+    host, sep, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+def metrics(stats):
+    """ statsd metrics of stats: timings and counters """
+    prefix = config.STATSD_PREFIX
+    lines = ['%s.total:%d|ms' % (prefix, stats.elapsed() * 1000)]
+    lines.extend(['%s.%s:%d|ms' % (prefix, phase, stats.timings[phase] * 1000)
+                  for phase in PHASES])
+    lines.extend(['%s.%s:%d|c' % (prefix, counter, value)
+                  for counter, value in sorted(stats.counters.items())])
+    if stats.cache is not None:
+        lines.append('%s.cache.%s:1|c' % (prefix, stats.cache))
+    return lines
+
+
+def send(address, lines):
+    """ Sends the statsd metrics in a datagram, errors are just logged """
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.sendto('\n'.join(lines), address)
+        finally:
+            sock.close()
+    except socket.error, e:
+        logger.warning('Cannot send the sitemap stats to statsd %s:%s: %s' %
+                       (address[0], address[1], e))
+
+
+class StatsView(BrowserView):
+    """ The stats of the latest sitemap requests of this process and the
+        memory used by its cache of sitemaps, as json
+    """
+
+    def __call__(self):
+        memory = getMemoryCache()
+        data = {'requests': recent(),
+                'memory': memory is not None and memory.usage() or None}
+        self.request.response.setHeader('Content-Type', 'application/json')
+        return json.dumps(data, indent=1)
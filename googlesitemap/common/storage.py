@@ -0,0 +1,171 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Pre-generated sitemaps stored on the filesystem.
+
+Configure a directory in zope.conf::
+
+    <product-config googlesitemap.common>
+        directory /var/sitemaps
+    </product-config>
+
+and every Plone site gets its own subdirectory with the gzipped sitemaps and
+a manifest of the changes they include (see invalidation). Sitemaps are
+served from there as they are; they are rebuilt by the regeneration entry
+points in googlesitemap.common.regenerate.
+"""
+
+import os
+import tempfile
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from googlesitemap.common import config
+
+MANIFEST = 'manifest.json'
+STATE = 'state.json'
+# held by the processes updating the manifest
+LOCK = 'manifest.lock'
+
+
+# the googlesitemap.common product-config, read once zope.conf has been loaded
+_productconfig = None
+
+
+def getProductConfig(name, default=None):
+    """ A setting of the googlesitemap.common product-config in zope.conf """
+    global _productconfig
+    if _productconfig is None:
+        try:
+            from App.config import getConfiguration
+        except ImportError:
+            return default
+        product_config = getattr(getConfiguration(), 'product_config', None)
+        if product_config is None:
+            # no product-config at all, or zope.conf not loaded yet
+            return default
+        _productconfig = product_config.get('googlesitemap.common', {})
+    return _productconfig.get(name, default)
+
+
+def getDirectory():
+    """ The configured sitemaps directory, None if not configured """
+    return getProductConfig('directory', config.DIRECTORY)
+
+
+def getStore(site):
+    """ The store of the sitemaps of site, None if not configured """
+    directory = getDirectory()
+    if not directory:
+        return None
+    return SitemapStore(os.path.join(directory, *site.getPhysicalPath()[1:]))
+
+
+class SitemapStore(object):
+    """ A directory of gzipped sitemaps """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, name):
+        """ File of the sitemap called name (as returned by gzipname) """
+        return os.path.join(self.directory, '%s.gz' % name)
+
+    def manifest(self):
+        """ name -> {'serial': ..., 'window': ...} of the stored sitemaps """
+        return self._load(MANIFEST)
+
+    def _load(self, filename):
+        try:
+            fp = open(os.path.join(self.directory, filename), 'rb')
+        except IOError:
+            return {}
+        try:
+            return json.load(fp)
+        finally:
+            fp.close()
+
+    def state(self):
+        """ What the last regeneration of the site recorded (see batch), {} if nothing """
+        return self._load(STATE)
+
+    def setstate(self, state):
+        self._replace(os.path.join(self.directory, STATE), [json.dumps(state)])
+
+    def _replace(self, filename, chunks):
+        """ Atomically replaces filename with the given data """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        fp = os.fdopen(fd, 'wb')
+        try:
+            try:
+                for chunk in chunks:
+                    fp.write(chunk)
+            finally:
+                fp.close()
+            os.rename(tmp, filename)
+        except:
+            os.remove(tmp)
+            raise
+
+    def write(self, name, chunks, serial, window):
+        """ Stores the sitemap called name, generated at serial covering window """
+        self.writefile(name, chunks)
+        self.update({name: (serial, window)})
+
+    def writefile(self, name, chunks):
+        """ Stores the sitemap called name, without recording it in the manifest """
+        self._replace(self.path(name), chunks)
+
+    def _lock(self):
+        """ The lock of the manifest, held from reading it to replacing it:
+            other processes and threads don't lose our changes
+        """
+        # cache imports this module
+        from googlesitemap.common.cache import FileLock
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        return FileLock(os.path.join(self.directory, LOCK))
+
+    def update(self, sitemaps):
+        """ Records the sitemaps in the manifest, sitemaps maps their names to
+            (serial, window)
+        """
+        lock = self._lock()
+        lock.acquire()
+        try:
+            manifest = self.manifest()
+            for name, (serial, window) in sitemaps.items():
+                manifest[name] = {'serial': serial, 'window': window}
+            self._replace(os.path.join(self.directory, MANIFEST), [json.dumps(manifest)])
+        finally:
+            lock.release()
+
+    def remove(self, name):
+        """ Removes the sitemap called name """
+        lock = self._lock()
+        lock.acquire()
+        try:
+            manifest = self.manifest()
+            if name in manifest:
+                del manifest[name]
+                self._replace(os.path.join(self.directory, MANIFEST), [json.dumps(manifest)])
+        finally:
+            lock.release()
+        if os.path.exists(self.path(name)):
+            os.remove(self.path(name))
@@ -0,0 +1,112 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+import shutil
+import tempfile
+import unittest
+
+from Products.CMFCore.utils import getToolByName
+
+from googlesitemap.common import config
+from googlesitemap.common import storage
+from googlesitemap.common.batch import plonesites
+from googlesitemap.common.batch import regeneratesite
+from googlesitemap.common.batch import summary
+from googlesitemap.common.batch import _tasks
+from googlesitemap.common.tests.base import TestCase
+
+
+class SummaryTestCase(unittest.TestCase):
+    """ the report of a run """
+
+    def test_summary(self):
+        reports = [{'site': '/plone', 'status': 'ok', 'sitemaps': ['sitemap.xml'],
+                    'seconds': 1.5, 'error': None},
+                   {'site': '/other', 'status': 'skipped', 'sitemaps': [],
+                    'seconds': 0.25, 'error': None}]
+        lines = summary(reports).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('ok '))
+        self.assertTrue(lines[0].endswith(' /plone'))
+        self.assertEqual(lines[2], '2 sites: 1 ok, 1 skipped, 1 sitemaps, 1.8s')
+
+    def test_nourl(self):
+        """ Sites without a public url are reported, not regenerated """
+        tasks, skipped = _tasks(['/plone', '/other'], {'/plone': 'http://www.example.com'},
+                                ['sitemap.xml.gz'], False, None)
+        self.assertEqual(tasks, [('/plone', 'http://www.example.com', ['sitemap.xml.gz'],
+                                  False, None)])
+        self.assertEqual([(report['site'], report['status']) for report in skipped],
+                         [('/other', 'nourl')])
+        self.assertTrue(skipped[0]['error'])
+
+
+class BatchTestCase(TestCase):
+    """ regeneration of many sites """
+
+    def afterSetUp(self):
+        super(BatchTestCase, self).afterSetUp()
+        site_properties = getToolByName(self.portal, 'portal_properties').site_properties
+        site_properties.manage_changeProperties(enable_sitemap=True)
+        self.loginAsPortalOwner()
+        for i in range(5):
+            self.portal.invokeFactory(id='doc%d' % i, type_name='Document')
+        self.logout()
+        self.maxlen = config.MAXLEN
+        config.MAXLEN = 2
+        config.DIRECTORY = tempfile.mkdtemp()
+
+    def beforeTearDown(self):
+        config.MAXLEN = self.maxlen
+        shutil.rmtree(config.DIRECTORY)
+        config.DIRECTORY = None
+
+    def test_plonesites(self):
+        self.assertTrue('/'.join(self.portal.getPhysicalPath()) in plonesites(self.app))
+
+    def test_skip_unchanged(self):
+        """ Sites are skipped until their catalog changes """
+        status, regenerated = regeneratesite(self.portal, ['sitemap.xml.gz'])
+        self.assertEqual(status, 'ok')
+        self.assertTrue(len(regenerated) > 1)
+        self.assertEqual(regeneratesite(self.portal, ['sitemap.xml.gz']), ('skipped', []))
+
+        self.loginAsPortalOwner()
+        self.portal.invokeFactory(id='doc5', type_name='Document')
+        self.logout()
+        self.assertEqual(regeneratesite(self.portal, ['sitemap.xml.gz'])[0], 'ok')
+
+    def test_skip_by_name(self):
+        """ Views not regenerated yet aren't skipped with the others """
+        regeneratesite(self.portal, ['sitemap.xml.gz'])
+        names = ['sitemap.xml.gz', 'sitemapindex.xml.gz']
+        self.assertEqual(regeneratesite(self.portal, names)[0], 'ok')
+        self.assertEqual(sorted(storage.getStore(self.portal).state().keys()), names)
+        self.assertEqual(regeneratesite(self.portal, names), ('skipped', []))
+
+    def test_budget(self):
+        """ Sites out of time write a sitemap, the rest is left for the next run """
+        status, regenerated = regeneratesite(self.portal, ['sitemap.xml.gz'], budget=1e-6)
+        self.assertEqual(status, 'timeout')
+        self.assertEqual(len(regenerated), 1)
+        self.assertFalse(storage.getStore(self.portal).state()['sitemap.xml.gz']['complete'])
+        status, regenerated = regeneratesite(self.portal, ['sitemap.xml.gz'])
+        self.assertEqual(status, 'ok')
+        self.assertTrue(regenerated)
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
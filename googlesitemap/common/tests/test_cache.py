@@ -0,0 +1,143 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from googlesitemap.common.cache import FilesystemCache
+from googlesitemap.common.cache import MemoryCache
+
+
+class FilesystemCacheTestCase(unittest.TestCase):
+    """ sitemaps cached in a directory shared by processes """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = FilesystemCache(os.path.join(self.directory, 'cache'), 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get(self):
+        self.assertEqual(self.cache.get('key'), None)
+        self.cache['key'] = 'data'
+        self.assertEqual(self.cache.get('key'), 'data')
+        self.assertEqual(FilesystemCache(self.cache.directory, 10).get('key'), 'data')
+        self.assertEqual(self.cache.size(), 4)
+
+    def test_evict(self):
+        """ The least recently used sitemaps go first """
+        self.cache['first'] = '1234'
+        self.cache['second'] = '1234'
+        # the mtime resolution may be a second
+        past = time.time() - 10
+        os.utime(self.cache._path('second'), (past, past))
+        self.cache.get('first')
+        self.cache['third'] = '1234'
+        self.assertEqual(self.cache.get('second'), None)
+        self.assertEqual(self.cache.get('first'), '1234')
+        self.assertEqual(self.cache.get('third'), '1234')
+        self.assertEqual(self.cache.size(), 8)
+
+    def test_lock(self):
+        """ One generation at a time for each key """
+        running = []
+        overlapped = []
+
+        def generate():
+            lock = self.cache.lock('key')
+            lock.acquire()
+            try:
+                if running:
+                    overlapped.append(True)
+                running.append(True)
+                time.sleep(0.01)
+                running.pop()
+            finally:
+                lock.release()
+
+        threads = [threading.Thread(target=generate) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlapped, [])
+
+    def test_lock_nonblocking(self):
+        lock = self.cache.lock('key')
+        self.assertTrue(lock.acquire())
+        try:
+            self.assertFalse(self.cache.lock('key').acquire(False))
+        finally:
+            lock.release()
+        other = self.cache.lock('key')
+        self.assertTrue(other.acquire(False))
+        other.release()
+
+
+class MemoryCacheTestCase(unittest.TestCase):
+    """ sitemaps cached in RAM within a byte budget """
+
+    def setUp(self):
+        self.cache = MemoryCache(10)
+
+    def test_get(self):
+        self.assertEqual(self.cache.get('sitemap.xml@1'), None)
+        self.cache['sitemap.xml@1'] = 'data'
+        self.assertEqual(self.cache.get('sitemap.xml@1'), 'data')
+        self.assertEqual(self.cache.size(), 4)
+
+    def test_versions(self):
+        """ A new version of a sitemap drops the previous one at once """
+        self.cache['sitemap.xml@1'] = '1234'
+        self.cache['0-sitemap.xml@1'] = '1234'
+        self.cache['sitemap.xml@2'] = '12'
+        self.assertEqual(self.cache.get('sitemap.xml@1'), None)
+        self.assertEqual(self.cache.get('sitemap.xml@2'), '12')
+        self.assertEqual(self.cache.get('0-sitemap.xml@1'), '1234')
+        usage = self.cache.usage()
+        self.assertEqual(usage['entries'], 2)
+        self.assertEqual(usage['bytes'], 6)
+        self.assertEqual(usage['replaced'], 1)
+        self.assertEqual(usage['evictions'], 0)
+
+    def test_evict(self):
+        """ The least recently used sitemaps go beyond maxsize """
+        self.cache['first@1'] = '1234'
+        self.cache['second@1'] = '1234'
+        self.cache.get('first@1')
+        self.cache['third@1'] = '1234'
+        self.assertEqual(self.cache.get('second@1'), None)
+        self.assertEqual(self.cache.get('first@1'), '1234')
+        self.assertEqual(self.cache.get('third@1'), '1234')
+        self.assertEqual(self.cache.size(), 8)
+        self.assertEqual(self.cache.usage()['evictions'], 1)
+
+    def test_too_large(self):
+        """ Sitemaps larger than maxsize aren't stored, the previous version stays """
+        self.cache['first@1'] = '1234'
+        self.cache['first@2'] = '12345678901'
+        self.assertEqual(self.cache.get('first@2'), None)
+        self.assertEqual(self.cache.get('first@1'), '1234')
+        self.assertEqual(self.cache.size(), 4)
+        self.assertEqual(self.cache.usage()['replaced'], 0)
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
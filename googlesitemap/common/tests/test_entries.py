@@ -0,0 +1,157 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+import time
+import unittest
+
+from googlesitemap.common import entries
+from googlesitemap.common.entries import SitemapEntries
+from googlesitemap.common.tests import test_sitemap
+
+NEVER = float('inf')
+
+
+class SitemapEntriesTestCase(unittest.TestCase):
+    """ the persistent store of the sitemap entries """
+
+    def setUp(self):
+        self.store = SitemapEntries()
+        for i in range(5):
+            self.store.index('/plone/doc%d' % i, 100.0 + i, 200.0 + i, 'Document',
+                             float('-inf'), NEVER)
+
+    def paths(self, items):
+        return [item.getPath() for item in items]
+
+    def test_order(self):
+        """ Newest Date first """
+        visible = self.store.visible()
+        self.assertEqual(len(visible), 5)
+        self.assertEqual(self.paths(visible),
+                         ['/plone/doc4', '/plone/doc3', '/plone/doc2', '/plone/doc1', '/plone/doc0'])
+        self.assertEqual(visible[1].Date, 103.0)
+        self.assertEqual(visible[1].modified, 203.0)
+        self.assertEqual(visible[1].portal_type, 'Document')
+        self.assertEqual(self.paths(visible[2:4]), ['/plone/doc2', '/plone/doc1'])
+
+    def test_catalog_date(self):
+        """ Entries keep Date as the catalog has it, their key its number """
+        self.store.index('/plone/doc5', 110.0, 210.0, 'Document', float('-inf'), NEVER,
+                         '1970-01-01 00:01:50')
+        self.assertEqual(self.store.visible()[0].Date, '1970-01-01 00:01:50')
+
+    def test_reindex(self):
+        """ Entries changing Date move """
+        self.store.index('/plone/doc0', 110.0, 210.0, 'Document', float('-inf'), NEVER)
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(self.paths(self.store.visible()[:2]), ['/plone/doc0', '/plone/doc4'])
+
+    def test_unindex(self):
+        self.store.unindex('/plone/doc2')
+        self.store.unindex('/plone/missing')
+        self.assertEqual(len(self.store), 4)
+        self.assertFalse('/plone/doc2' in self.paths(self.store.visible()))
+
+    def test_publication_window(self):
+        """ Entries not yet effective or expired are hidden """
+        now = time.time()
+        self.store.index('/plone/future', 90.0, 90.0, 'Document', now + 3600, NEVER)
+        self.store.index('/plone/expired', 91.0, 91.0, 'Document', float('-inf'), now - 3600)
+        self.assertEqual(len(self.store.windows), 2)
+        self.assertEqual(len(self.store.visible(now)), 5)
+        self.assertEqual(self.paths(self.store.visible(now + 7200))[-1], '/plone/future')
+        self.store.unindex('/plone/future')
+        self.store.unindex('/plone/expired')
+        self.assertEqual(len(self.store.windows), 0)
+        self.assertEqual(len(self.store.starts), 0)
+
+    def test_hidden_positions(self):
+        """ Positions skip the hidden entries in front of them """
+        now = time.time()
+        self.store.index('/plone/doc3', 103.0, 203.0, 'Document', now + 3600, NEVER)
+        self.store.index('/plone/doc1', 101.0, 201.0, 'Document', float('-inf'), now - 1)
+        visible = self.store.visible(now)
+        self.assertEqual(len(visible), 3)
+        self.assertEqual([visible[i].getPath() for i in range(3)],
+                         ['/plone/doc4', '/plone/doc2', '/plone/doc0'])
+        self.assertEqual(visible[-1].getPath(), '/plone/doc0')
+        self.assertEqual(self.paths(visible[1:3]), ['/plone/doc2', '/plone/doc0'])
+        self.assertEqual(self.paths(visible), ['/plone/doc4', '/plone/doc2', '/plone/doc0'])
+        self.assertRaises(IndexError, visible.__getitem__, 3)
+
+    def test_settle(self):
+        """ Entries leave the windows once they are effective """
+        now = time.time()
+        self.store.index('/plone/doc0', 100.0, 200.0, 'Document', time.time() - 1, NEVER)
+        self.assertEqual(len(self.store.windows), 0)
+        self.store.index('/plone/doc1', 101.0, 201.0, 'Document', now + 0.01, NEVER)
+        self.assertEqual(len(self.store.windows), 1)
+        time.sleep(0.02)
+        self.store.index('/plone/doc2', 102.0, 202.0, 'Document', float('-inf'), NEVER)
+        self.assertEqual(len(self.store.windows), 0)
+        self.assertEqual(len(self.store.starts), 0)
+
+
+class EntriesTestCase(test_sitemap.SiteMapFixture):
+    """ sitemaps read from the entry store """
+
+    def afterSetUp(self):
+        super(EntriesTestCase, self).afterSetUp()
+        self.loginAsPortalOwner()
+        self.store = entries.rebuild(self.portal)
+        self.logout()
+
+    def test_rebuild(self):
+        paths = [item.getPath() for item in self.store.visible()]
+        self.assertTrue('/plone/published' in paths)
+        self.assertFalse('/plone/private' in paths)
+        self.assertFalse('/plone/pending' in paths)
+
+    def test_same_sitemap(self):
+        """ The store gives the sitemap of the catalog """
+        sitemap = self.sitemap
+        stored = self.uncompress(sitemap())
+        self.assertEqual(sitemap.catalog_queries, 0)
+        sitemap = self.sitemap
+        sitemap.use_entries = False
+        self.assertEqual(self.uncompress(sitemap()), stored)
+
+    def test_events(self):
+        """ The store follows workflow transitions, renames and removals """
+        self.loginAsPortalOwner()
+        self.wftool.doActionFor(self.portal.pending, 'publish')
+        self.wftool.doActionFor(self.portal.published, 'retract')
+        self.portal.manage_renameObject('pending', 'renamed')
+        self.portal.manage_delObjects(['file1'])
+        self.logout()
+
+        xml = self.uncompress(self.sitemap())
+        self.assertTrue('<loc>http://nohost/plone/renamed</loc>' in xml)
+        self.assertFalse('<loc>http://nohost/plone/pending</loc>' in xml)
+        self.assertFalse('<loc>http://nohost/plone/published</loc>' in xml)
+        self.assertFalse(self.file1.absolute_url() in xml)
+
+    def test_authenticated(self):
+        """ Authenticated users get their sitemap from the catalog """
+        self.loginAsPortalOwner()
+        sitemap = self.sitemap
+        xml = self.uncompress(sitemap())
+        self.assertTrue('<loc>http://nohost/plone/private</loc>' in xml)
+        self.assertTrue(sitemap.catalog_queries > 0)
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
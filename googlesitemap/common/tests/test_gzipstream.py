@@ -0,0 +1,58 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+import unittest
+from gzip import GzipFile
+from StringIO import StringIO
+
+from googlesitemap.common import gzipstream
+
+
+class GzipStreamTestCase(unittest.TestCase):
+    """ incremental compression """
+
+    chunks = ['<url>%d</url>\n' % i for i in range(10000)]
+
+    def test_gzipfile(self):
+        """ Same bytes written by GzipFile """
+        fp = StringIO()
+        gzip = GzipFile('sitemap.xml', 'w', 6, fp, mtime=1336132800)
+        gzip.write(''.join(self.chunks))
+        gzip.close()
+
+        data = ''.join(gzipstream.compress(self.chunks, 'sitemap.xml', 6, 1024, 1336132800))
+        self.assertEqual(data, fp.getvalue())
+
+    def test_chunks(self):
+        """ Output is yielded while compressing """
+        data = list(gzipstream.compress(self.chunks, 'sitemap.xml', 6, 1024))
+        self.assertTrue(len(data) > 1)
+        unzipped = GzipFile(fileobj=StringIO(''.join(data))).read()
+        self.assertEqual(unzipped, ''.join(self.chunks))
+
+    def test_members(self):
+        """ Members joined are a gzip file of their contents joined """
+        members = [gzipstream.member(chunk) for chunk in self.chunks[:3]]
+        self.assertEqual(gzipstream.member(self.chunks[0]), members[0])
+        self.assertEqual(gzipstream.decompress(''.join(members)), ''.join(self.chunks[:3]))
+
+    def test_empty(self):
+        data = ''.join(gzipstream.compress([], 'sitemap.xml'))
+        self.assertEqual(GzipFile(fileobj=StringIO(data)).read(), '')
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,155 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+import unittest
+
+from googlesitemap.common import config
+from googlesitemap.common.invalidation import SitemapChanges
+from googlesitemap.common.invalidation import EVERYTHING
+from googlesitemap.common.invalidation import INDEX
+from googlesitemap.common.invalidation import ANNOTATION_KEY
+from googlesitemap.common.invalidation import token
+from googlesitemap.common.invalidation import remember
+
+
+class SitemapChangesTestCase(unittest.TestCase):
+    """ which sitemaps are affected by content changes """
+
+    def setUp(self):
+        self.changes = SitemapChanges()
+        self.changes.added('/plone/news', 100.0)
+        self.serial = self.changes.serial()
+
+    def tearDown(self):
+        config.MAXCHANGES = 10000
+        config.MAXDATES = 100000
+        config.MAXNAMES = 10000
+
+    def test_nochanges(self):
+        self.assertFalse(self.changes.affects(self.serial, (150.0, 50.0)))
+        self.assertFalse(self.changes.affects(self.serial, INDEX))
+        self.assertTrue(self.changes.affects(0, INDEX))
+
+    def test_modified(self):
+        """ Modified entries affect only the shard including them """
+        self.changes.modified('/plone/news', 100.0)
+        self.assertTrue(self.changes.affects(self.serial, (150.0, 50.0)))
+        self.assertTrue(self.changes.affects(self.serial, EVERYTHING))
+        self.assertFalse(self.changes.affects(self.serial, (50.0, 10.0)))
+        self.assertFalse(self.changes.affects(self.serial, (200.0, 150.0)))
+        self.assertFalse(self.changes.affects(self.serial, INDEX))
+
+    def test_added(self):
+        """ Added entries shift all the following shards """
+        self.changes.added('/plone/events', 120.0)
+        self.assertTrue(self.changes.affects(self.serial, (150.0, 50.0)))
+        self.assertTrue(self.changes.affects(self.serial, (50.0, 10.0)))
+        self.assertFalse(self.changes.affects(self.serial, (200.0, 150.0)))
+        self.assertTrue(self.changes.affects(self.serial, INDEX))
+
+    def test_date_changed(self):
+        """ Entries changing Date move between shards """
+        self.changes.modified('/plone/news', 20.0)
+        self.assertTrue(self.changes.affects(self.serial, (50.0, 30.0)))
+        self.assertTrue(self.changes.affects(self.serial, INDEX))
+        self.assertFalse(self.changes.affects(self.serial, (10.0, 5.0)))
+        self.assertFalse(self.changes.affects(self.serial, (200.0, 150.0)))
+
+    def test_unknown(self):
+        """ Entries never seen may be anywhere """
+        self.changes.modified('/plone/front-page', 20.0)
+        self.assertTrue(self.changes.affects(self.serial, (10.0, 5.0)))
+        self.assertTrue(self.changes.affects(self.serial, INDEX))
+
+    def test_discarded(self):
+        config.MAXCHANGES = 1
+        self.changes.modified('/plone/news', 100.0)
+        self.changes.modified('/plone/news', 100.0)
+        self.assertTrue(self.changes.affects(self.serial, (10.0, 5.0)))
+
+    def test_discarded_in_batches(self):
+        """ Changes are discarded every MAXCHANGES / 100 changes """
+        config.MAXCHANGES = 1000
+        for i in range(1008):
+            self.changes.modified('/plone/news', 100.0)
+        self.assertEqual(len(self.changes.log), 1009)
+        self.changes.modified('/plone/news', 100.0)
+        self.assertEqual(len(self.changes.log), 1000)
+        self.assertTrue(self.changes.affects(self.serial, (10.0, 5.0)))
+
+    def test_concurrent(self):
+        """ Changes logged with the same serial by concurrent transactions """
+        self.changes.modified('/plone/news', 100.0)
+        serial = self.changes.serial()
+        self.changes.log[(serial, -1)] = (10.0, 10.0, False, 0.0)
+        self.assertEqual(len(self.changes.log), 3)
+        self.assertTrue(self.changes.affects(self.serial, (20.0, 5.0)))
+        self.assertEqual(self.changes.lastchange((20.0, 5.0)), (serial, 0.0))
+        self.assertEqual(self.changes.lastchange((150.0, 50.0))[0], serial)
+
+    def test_dates_bounded(self):
+        """ Past MAXDATES paths the dates are forgotten """
+        config.MAXDATES = 2
+        self.changes.added('/plone/events', 20.0)
+        self.changes.added('/plone/front-page', 30.0)
+        self.assertEqual(list(self.changes.dates.keys()), ['/plone/front-page'])
+        serial = self.changes.serial()
+        self.changes.modified('/plone/news', 100.0)
+        self.assertTrue(self.changes.affects(serial, (10.0, 5.0)))
+        self.changes.removed('/plone/news', 100.0)
+        self.assertEqual(self.changes.size(), 1)
+
+    def test_lastchange(self):
+        self.assertEqual(self.changes.lastchange((150.0, 50.0))[0], self.serial)
+        self.changes.modified('/plone/news', 100.0)
+        serial = self.changes.serial()
+        self.changes.added('/plone/events', 10.0)
+        self.assertEqual(self.changes.lastchange((150.0, 50.0))[0], serial)
+        self.assertEqual(self.changes.lastchange((40.0, 5.0))[0], serial + 1)
+        self.assertEqual(SitemapChanges().lastchange(INDEX), (0, None))
+
+    def test_lastchange_discarded(self):
+        config.MAXCHANGES = 1
+        self.changes.added('/plone/events', 10.0)
+        serial, when = self.changes.lastchange((150.0, 50.0))
+        self.assertEqual(serial, self.serial)
+        self.assertTrue(when is not None)
+
+    def test_remember(self):
+        """ Names remembered by each process are forgotten when too many """
+        config.MAXNAMES = 2
+        names = {}
+        remember(names, 'a', 1)
+        remember(names, 'b', 2)
+        remember(names, 'b', 3)
+        self.assertEqual(names, {'a': 1, 'b': 3})
+        remember(names, 'c', 4)
+        self.assertEqual(names, {'c': 4})
+
+    def test_token(self):
+        """ The generation token follows the changes log of the portal """
+        class Portal(object):
+            pass
+        portal = Portal()
+        self.assertEqual(token(portal), 0)
+        portal.__annotations__ = {ANNOTATION_KEY: self.changes}
+        self.assertEqual(token(portal), self.serial)
+        self.changes.modified('/plone/news', 100.0)
+        self.assertEqual(token(portal), self.serial + 1)
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
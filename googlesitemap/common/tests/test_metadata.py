@@ -0,0 +1,73 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+import unittest
+
+from DateTime import DateTime
+
+from googlesitemap.common import metadata
+
+
+class Brain(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def getPath(self):
+        return self.path
+
+    def getURL(self):
+        return 'http://other' + self.path
+
+
+class MetadataTestCase(unittest.TestCase):
+    """ the fast path gives the same of getURL() and HTML4() """
+
+    def test_lastmod(self):
+        for value in ('2010/12/14 10:53:21.999 GMT+1',
+                      '1999/12/31 23:59:59 US/Eastern',
+                      '2012/02/29 00:00:00 UTC'):
+            date = DateTime(value)
+            self.assertEqual(metadata.lastmod(date), date.HTML4())
+            # cached
+            self.assertEqual(metadata.lastmod(date), date.HTML4())
+            # stored entries have numbers
+            self.assertEqual(metadata.lastmod(date.timeTime()), date.HTML4())
+
+    def test_iso8601(self):
+        for value in ('2010-12-14 10:53:21', '2010-07-14 10:53:21',
+                      '2012/02/29 00:00:00 UTC', '2012-02-29T00:00:00+01:00',
+                      '2012-02-29T00:00:00-05:00', '2012-02-29T00:00:00Z',
+                      DateTime('1999/12/31 23:59:59 US/Eastern'),
+                      1292323999.5, 1279104801):
+            self.assertEqual(metadata.iso8601(value), DateTime(value).ISO8601())
+            # cached
+            self.assertEqual(metadata.iso8601(value), DateTime(value).ISO8601())
+
+    def test_url(self):
+        url = metadata.URLResolver('/plone', 'http://nohost/plone')
+        self.assertEqual(url(Brain('/plone')), 'http://nohost/plone')
+        self.assertEqual(url(Brain('/plone/news/a b')),
+                         'http://nohost/plone/news/a%20b')
+        self.assertEqual(url(Brain('/plone-other/news')),
+                         'http://other/plone-other/news')
+
+    def test_url_root(self):
+        url = metadata.URLResolver('/', 'http://nohost')
+        self.assertEqual(url(Brain('/news')), 'http://nohost/news')
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
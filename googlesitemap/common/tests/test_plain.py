@@ -0,0 +1,91 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+import unittest
+from gzip import GzipFile
+from StringIO import StringIO
+
+from zope.component import getMultiAdapter
+
+from Products.CMFCore.utils import getToolByName
+
+from googlesitemap.common.plain import acceptsGzip
+from googlesitemap.common.tests.base import TestCase
+
+
+class AcceptEncodingTestCase(unittest.TestCase):
+    """ Accept-Encoding negotiation """
+
+    def test_accepts(self):
+        self.assertTrue(acceptsGzip('gzip'))
+        self.assertTrue(acceptsGzip('gzip, deflate'))
+        self.assertTrue(acceptsGzip('deflate, x-gzip;q=0.5'))
+        self.assertTrue(acceptsGzip('*'))
+
+    def test_refuses(self):
+        self.assertFalse(acceptsGzip(''))
+        self.assertFalse(acceptsGzip('identity'))
+        self.assertFalse(acceptsGzip('gzip;q=0'))
+        self.assertFalse(acceptsGzip('gzip;q=0, *'))
+        self.assertFalse(acceptsGzip('*;q=0'))
+
+
+class PlainSiteMapTestCase(TestCase):
+    """ sitemap.xml, out of the Gzipped sitemap """
+
+    def afterSetUp(self):
+        super(PlainSiteMapTestCase, self).afterSetUp()
+        site_properties = getToolByName(self.portal, 'portal_properties').site_properties
+        site_properties.manage_changeProperties(enable_sitemap=True)
+        self.request = self.portal.REQUEST
+        self.response = self.request.response
+
+    def view(self, name='sitemap.xml', accept_encoding=None):
+        self.request.environ.pop('HTTP_ACCEPT_ENCODING', None)
+        if accept_encoding is not None:
+            self.request.environ['HTTP_ACCEPT_ENCODING'] = accept_encoding
+        return getMultiAdapter((self.portal, self.request), name=name)
+
+    def test_identity(self):
+        gzipped = self.view('sitemap.xml.gz')()
+        xml = GzipFile(fileobj=StringIO(gzipped)).read()
+        view = self.view()
+        # generated once
+        view._uncachedgenerate = None
+        self.assertEqual(view(), xml)
+        self.assertEqual(self.response.getHeader('Content-Type'), 'text/xml; charset=utf-8')
+        self.assertEqual(self.response.getHeader('Content-Encoding'), None)
+
+    def test_gzip(self):
+        gzipped = self.view('sitemap.xml.gz')()
+        etag = self.response.getHeader('ETag')
+        view = self.view(accept_encoding='gzip, deflate')
+        view._uncachedgenerate = None
+        self.assertEqual(view(), gzipped)
+        self.assertEqual(self.response.getHeader('Content-Encoding'), 'gzip')
+        self.assertEqual(self.response.getHeader('Vary'), 'Accept-Encoding')
+        self.assertEqual(self.response.getHeader('ETag'), etag)
+
+        # the uncompressed sitemap is another entity
+        self.view()()
+        self.assertNotEqual(self.response.getHeader('ETag'), etag)
+
+    def test_recent(self):
+        xml = self.view('sitemap-recent.xml')()
+        self.assertTrue(xml.startswith('<?xml'))
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
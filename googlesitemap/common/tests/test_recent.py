@@ -0,0 +1,100 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+import time
+from gzip import GzipFile
+from StringIO import StringIO
+
+from DateTime import DateTime
+from zExceptions import BadRequest
+
+from Products.CMFCore.utils import getToolByName
+
+from googlesitemap.common import config
+from googlesitemap.common.recent import RecentSiteMapView
+from googlesitemap.common.tests.base import TestCase
+
+
+class RecentSiteMapTestCase(TestCase):
+    """ the sitemap of the recently changed items """
+
+    def afterSetUp(self):
+        super(RecentSiteMapTestCase, self).afterSetUp()
+        self.site_properties = getToolByName(
+            self.portal, 'portal_properties').site_properties
+        self.site_properties.manage_changeProperties(enable_sitemap=True)
+        wftool = getToolByName(self.portal, 'portal_workflow')
+        wftool.setChainForPortalTypes(['Document'], 'simple_publication_workflow')
+
+        self.loginAsPortalOwner()
+        for id in ('old', 'new'):
+            self.portal.invokeFactory(id=id, type_name='Document')
+            wftool.doActionFor(self.portal[id], 'publish')
+        self.portal.old.setModificationDate(DateTime() - 5)
+        self.portal.old.reindexObject()
+        self.logout()
+
+    def recent(self, **form):
+        request = self.portal.REQUEST
+        for name in ('since', 'hours'):
+            request.form.pop(name, None)
+            request.other.pop(name, None)
+        request.form.update(form)
+        request.other.update(form)
+        return RecentSiteMapView(self.portal, request)
+
+    def uncompress(self, sitemapdata):
+        return GzipFile(fileobj=StringIO(sitemapdata)).read()
+
+    def test_hours(self):
+        xml = self.uncompress(self.recent()())
+        self.assertTrue('<loc>http://nohost/plone/new</loc>' in xml)
+        self.assertFalse('<loc>http://nohost/plone/old</loc>' in xml)
+
+        xml = self.uncompress(self.recent(hours='240')())
+        self.assertTrue('<loc>http://nohost/plone/old</loc>' in xml)
+
+    def test_since(self):
+        xml = self.uncompress(self.recent(since=(DateTime() - 8).ISO8601())())
+        self.assertTrue('<loc>http://nohost/plone/new</loc>' in xml)
+        self.assertTrue('<loc>http://nohost/plone/old</loc>' in xml)
+
+        xml = self.uncompress(self.recent(since=(DateTime() + 1).ISO8601())())
+        self.assertFalse('<url>' in xml)
+
+    def test_invalid(self):
+        self.assertRaises(BadRequest, self.recent(since='not a date'))
+        self.assertRaises(BadRequest, self.recent(hours='many'))
+        self.assertRaises(BadRequest, self.recent(hours='-1'))
+
+    def test_max_hours(self):
+        """ Crawlers can't ask for more than RECENT_MAX_HOURS, since is rounded down """
+        oldest = time.time() - config.RECENT_MAX_HOURS * 3600
+        for form in ({'hours': '100000'}, {'since': '1990-01-01T00:00:00Z'}):
+            since = self.recent(**form).since()
+            self.assertTrue(oldest - config.RECENT_TTL <= since <= oldest)
+            self.assertEqual(since % config.RECENT_TTL, 0)
+
+    def test_cached(self):
+        data = self.recent().generate()
+        recent = self.recent()
+        recent._uncachedgenerate = None
+        self.assertEqual(recent.generate(), data)
+        self.assertEqual(recent.stats.cache, 'hit')
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
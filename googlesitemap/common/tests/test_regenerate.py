@@ -0,0 +1,168 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+import os
+import shutil
+import tempfile
+import unittest
+
+from zExceptions import BadRequest
+try:
+    from zope.site.hooks import setSite
+except ImportError:
+    from zope.app.component.hooks import setSite
+
+from Products.CMFCore.utils import getToolByName
+
+from googlesitemap.common import config
+from googlesitemap.common import storage
+from googlesitemap.common.regenerate import _batches
+from googlesitemap.common.regenerate import _generatebatch
+from googlesitemap.common.regenerate import _opensite
+from googlesitemap.common.regenerate import _sitemapview
+from googlesitemap.common.regenerate import _virtualhost
+from googlesitemap.common.regenerate import _write
+from googlesitemap.common.regenerate import ispublic
+from googlesitemap.common.regenerate import regenerate
+from googlesitemap.common.regenerate import RegenerateView
+from googlesitemap.common.tests.base import TestCase
+
+
+class BatchesTestCase(unittest.TestCase):
+    """ shards split among workers """
+
+    def test_batches(self):
+        self.assertEqual(_batches(range(7), 3), [[0, 1, 2], [3, 4], [5, 6]])
+        self.assertEqual(_batches(range(2), 4), [[0], [1]])
+        self.assertEqual(_batches([], 4), [])
+
+
+class PublicURLTestCase(unittest.TestCase):
+    """ urls of sites reached on their backend aren't stored """
+
+    def test_ispublic(self):
+        for url in ('http://www.example.com/plone', 'https://example.com:8443',
+                    'http://8.8.8.8/plone', 'http://172.32.0.1'):
+            self.assertTrue(ispublic(url), url)
+        for url in ('http://nohost/plone', 'http://localhost:8080/plone',
+                    'http://backend1:8080', 'http://127.0.0.1:8080/plone',
+                    'http://10.0.0.5', 'http://192.168.1.2', 'http://172.16.0.1',
+                    'http://www.localhost', 'http://[::1]:8080'):
+            self.assertFalse(ispublic(url), url)
+
+
+class InProcessPool(object):
+    """ Generates each batch with a view of its own, as workers do """
+
+    def generate(self, site, name, sitemaps, mtime):
+        store = storage.getStore(site)
+        written = []
+        for batch in _batches(sitemaps, 3):
+            view = _sitemapview(site, name)
+            for index, part in batch:
+                view.index, view.part = index, part
+                written.append(_write(view, store, mtime))
+        return written
+
+
+class RegenerateTestCase(TestCase):
+    """ regeneration of pre-generated sitemaps """
+
+    def afterSetUp(self):
+        super(RegenerateTestCase, self).afterSetUp()
+        site_properties = getToolByName(self.portal, 'portal_properties').site_properties
+        site_properties.manage_changeProperties(enable_sitemap=True)
+        self.loginAsPortalOwner()
+        for i in range(7):
+            self.portal.invokeFactory(id='doc%d' % i, type_name='Document')
+        self.maxlen = config.MAXLEN
+        config.MAXLEN = 2
+        self.directory = tempfile.mkdtemp()
+
+    def beforeTearDown(self):
+        config.MAXLEN = self.maxlen
+        config.DIRECTORY = None
+        shutil.rmtree(self.directory)
+
+    def files(self):
+        directory = storage.getStore(self.portal).directory
+        files = {}
+        for name in os.listdir(directory):
+            files[name] = open(os.path.join(directory, name), 'rb').read()
+        return files
+
+    def regenerate(self, pool=None):
+        config.DIRECTORY = os.path.join(self.directory, pool and 'parallel' or 'serial')
+        names = regenerate(self.portal, 'sitemapindex.xml.gz', pool=pool, mtime=1336132800)
+        return names, self.files()
+
+    def test_parallel(self):
+        """ Sitemaps generated in parallel are the same """
+        serial = self.regenerate()
+        self.assertTrue(len(serial[0]) > 3)
+        self.assertEqual(self.regenerate(InProcessPool()), serial)
+
+    def test_generatebatch(self):
+        """ Workers generate the sitemaps of the site as a single process does """
+        url = 'https://www.example.com'
+        path = '/'.join(self.portal.getPhysicalPath())
+        config.DIRECTORY = os.path.join(self.directory, 'worker')
+        # the worker sees the committed site only, and aborts the transaction
+        # of the test too when it's done
+        written = _generatebatch((path, url, 'sitemapindex.xml.gz', [(None, None)],
+                                  1336132800))
+        setSite(self.portal)
+        worker = self.files()
+
+        config.DIRECTORY = os.path.join(self.directory, 'process')
+        _virtualhost(self.portal.REQUEST, self.portal, url)
+        view = _sitemapview(self.portal, 'sitemapindex.xml.gz')
+        self.assertEqual(written, [_write(view, storage.getStore(self.portal), 1336132800)])
+        self.assertEqual(worker, self.files())
+
+    def test_virtualhost(self):
+        """ Worker requests generate the urls of the site at its public url """
+        path = '/'.join(self.portal.getPhysicalPath())
+        for url in ('https://www.example.com', 'http://www.example.com:8080/plone'):
+            app, site = _opensite(path, url)
+            try:
+                self.assertEqual(site.absolute_url(), url)
+                self.assertEqual(site.portal_catalog.absolute_url(), url + '/portal_catalog')
+            finally:
+                app._p_jar.close()
+                setSite(self.portal)
+
+        # not the port of the backend
+        request = self.portal.REQUEST
+        request.setServerURL('http', 'backend', '8080')
+        _virtualhost(request, self.portal, 'https://www.example.com')
+        self.assertEqual(self.portal.absolute_url(), 'https://www.example.com')
+
+    def test_view_public_url(self):
+        """ The view doesn't store the urls of the backend """
+        config.DIRECTORY = self.directory
+        view = RegenerateView(self.portal, self.portal.REQUEST)
+        self.assertRaises(BadRequest, view)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_pool_deadline(self):
+        """ Pools don't stop at deadlines """
+        config.DIRECTORY = self.directory
+        self.assertRaises(ValueError, regenerate, self.portal, 'sitemapindex.xml.gz',
+                          pool=InProcessPool(), deadline=1.0)
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,60 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+import unittest
+
+from googlesitemap.common import serializer
+
+
+class SerializerTestCase(unittest.TestCase):
+    """ serializer output, it must match the sitemap templates """
+
+    def test_url(self):
+        xml = serializer.url({'loc': 'http://nohost/plone/a&b',
+                              'lastmod': '2010-12-14T10:53:21Z'})
+        self.assertEqual(xml, '\n    <url>\n'
+                              '        <loc>http://nohost/plone/a&amp;b</loc>\n'
+                              '        <lastmod> 2010-12-14T10:53:21Z </lastmod>\n'
+                              '        \n'
+                              '        \n'
+                              '    </url>\n\n')
+
+    def test_url_optional(self):
+        xml = serializer.url({'loc': u'http://nohost/plone/\xe0',
+                              'lastmod': None,
+                              'changefreq': 'daily',
+                              'priority': 0.5})
+        self.assertTrue('<loc>http://nohost/plone/\xc3\xa0</loc>' in xml)
+        self.assertFalse('<lastmod>' in xml)
+        self.assertTrue('<changefreq>daily</changefreq>' in xml)
+        self.assertTrue('<priority>0.5</priority>' in xml)
+
+    def test_urlset(self):
+        xml = ''.join(serializer.urlset([]))
+        self.assertTrue(xml.startswith('<?xml version="1.0" encoding="UTF-8"?>\n<urlset '))
+        self.assertTrue(xml.endswith('>\n\n\n</urlset>\n'))
+
+    def test_sitemapindex(self):
+        xml = ''.join(serializer.sitemapindex([{'url': 'http://nohost/plone/sitemap.xml?index=0',
+                                                'maxdate': '2010-12-14T10:53:21+00:00'}]))
+        self.assertTrue('   <sitemap>\n'
+                        '      <loc>http://nohost/plone/sitemap.xml?index=0</loc>\n'
+                        '      <lastmod>2010-12-14T10:53:21+00:00</lastmod>\n'
+                        '   </sitemap>\n</sitemapindex>\n' in xml)
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
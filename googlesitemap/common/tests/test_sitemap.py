@@ -13,22 +13,33 @@
 # Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
 # 02111-1307, USA.
 
+import shutil
+import tempfile
 from gzip import GzipFile
 from StringIO import StringIO
 
+from DateTime import DateTime
 from zope.component import getMultiAdapter
+from zope.event import notify
+from zope.lifecycleevent import ObjectModifiedEvent
 from zope.publisher.interfaces import INotFound
 
 from Products.CMFCore.utils import getToolByName
 
+from googlesitemap.common import cache
+from googlesitemap.common import config
+from googlesitemap.common import serializer
 from googlesitemap.common.tests.base import TestCase
 
 
-class SiteMapTestCase(TestCase):
-    """base test case with convenience methods for all sitemap tests"""
+class SiteMapFixture(TestCase):
+    """base test case with convenience methods for all sitemap tests, and
+    no tests of its own"""
 
     def afterSetUp(self):
-        super(SiteMapTestCase, self).afterSetUp()
+        super(SiteMapFixture, self).afterSetUp()
+        # sitemaps generated by the other tests are not ours
+        cache._memorycache = None
         self.wftool = getToolByName(self.portal, 'portal_workflow')
 
         # we need to explizitly set a workflow cause we can't rely on the
@@ -84,6 +95,10 @@ class SiteMapTestCase(TestCase):
         unziped.close()
         return xml
 
+
+class SiteMapTestCase(SiteMapFixture):
+    """ the standard sitemap """
+
     def test_layers(self):
         """ Browser layers setup """
         from googlesitemap.common.interfaces import ISitemapLayer
@@ -211,6 +226,307 @@ class SiteMapTestCase(TestCase):
         self.assertTrue('<lastmod> %s </lastmod>' % zulu_time in xml)
         self.assertFalse('<lastmod>%s</lastmod>' % zulu_time in xml)
 
+    def test_serializer(self):
+        """ The serializer output is the same of the sitemap template """
+        self.loginAsPortalOwner()
+        sitemap = self.sitemap
+        self.assertEqual(''.join(serializer.urlset(sitemap.objects())),
+                         sitemap.template())
+
+        sitemap.use_template = True
+        self.assertEqual(''.join(sitemap._render()), sitemap.template())
+
+    def test_metadata(self):
+        """ loc and lastmod come from the catalog metadata """
+        self.loginAsPortalOwner()
+        sitemap = self.sitemap
+        expected = []
+        for brain in sitemap._slicecatalogbrains():
+            lastmod = brain.modified.HTML4()
+            if brain.portal_type in ('File', 'Image'):
+                expected.append(dict(loc='%s/view' % brain.getURL(),
+                                     lastmod=lastmod))
+            if brain.portal_type != 'Image':
+                expected.append(dict(loc=brain.getURL(), lastmod=lastmod))
+        self.assertEqual(list(sitemap.objects()), expected)
+
+    def test_streaming(self):
+        """ Streamed sitemaps are written to the response and then cached """
+        sitemap = self.sitemap
+        written = []
+        sitemap.request.response.write = written.append
+        self.assertEqual(sitemap.stream(), '')
+        self.assertTrue(len(written) > 0)
+        self.assertEqual(''.join(written), sitemap.generate())
+
+        # cached sitemaps are written at once
+        del written[:]
+        self.assertEqual(sitemap.stream(), sitemap.generate())
+        self.assertEqual(written, [])
+
+    def test_stale_while_revalidate(self):
+        """ While a sitemap is regenerated the previous version is served """
+        from googlesitemap.common.cache import threadLock
+        from googlesitemap.common.sitemap import _generatestorage
+
+        data = self.sitemap.generate()
+        self.loginAsPortalOwner()
+        self.wftool.doActionFor(self.portal.pending, 'publish')
+        self.logout()
+
+        config.STALE_WHILE_REVALIDATE = True
+        try:
+            sitemap = self.sitemap
+            lock = threadLock(_generatestorage(sitemap)[1])
+            lock.acquire()
+            try:
+                self.assertEqual(sitemap.generate(), data)
+                self.assertTrue(sitemap.stale)
+            finally:
+                lock.release()
+        finally:
+            config.STALE_WHILE_REVALIDATE = False
+
+        sitemap = self.sitemap
+        xml = self.uncompress(sitemap.generate())
+        self.assertFalse(sitemap.stale)
+        self.assertTrue('<loc>http://nohost/plone/pending</loc>' in xml)
+
+    def test_streaming_locked(self):
+        """ Sitemaps being generated by somebody else aren't streamed again """
+        from googlesitemap.common.cache import threadLock
+        from googlesitemap.common.sitemap import _generatestorage
+
+        data = self.sitemap.generate()
+        self.loginAsPortalOwner()
+        self.wftool.doActionFor(self.portal.pending, 'publish')
+        self.logout()
+
+        config.STALE_WHILE_REVALIDATE = True
+        try:
+            sitemap = self.sitemap
+            written = []
+            sitemap.request.response.write = written.append
+            lock = threadLock(_generatestorage(sitemap)[1])
+            lock.acquire()
+            try:
+                self.assertEqual(sitemap.stream(('"etag"', None)), data)
+                self.assertTrue(sitemap.stale)
+                self.assertEqual(written, [])
+                self.assertNotEqual(sitemap.request.response.getHeader('ETag'), '"etag"')
+            finally:
+                lock.release()
+        finally:
+            config.STALE_WHILE_REVALIDATE = False
+
+    def test_stored(self):
+        """ Pre-generated sitemaps are served as they are """
+        from googlesitemap.common.regenerate import regenerate
+
+        directory = tempfile.mkdtemp()
+        config.DIRECTORY = directory
+        try:
+            self.loginAsPortalOwner()
+            self.assertEqual(regenerate(self.portal, 'sitemapindex.xml.gz'), ['sitemap.xml'])
+            # up to date
+            self.assertEqual(regenerate(self.portal, 'sitemapindex.xml.gz'), [])
+            self.logout()
+
+            stored = self.sitemap()
+            xml = self.uncompress(stored.read())
+            self.assertFalse('<loc>http://nohost/plone/private</loc>' in xml)
+            self.assertTrue('<loc>http://nohost/plone/published</loc>' in xml)
+
+            self.loginAsPortalOwner()
+            self.wftool.doActionFor(self.portal.pending, 'publish')
+            self.assertEqual(regenerate(self.portal, 'sitemapindex.xml.gz'), ['sitemap.xml'])
+        finally:
+            config.DIRECTORY = None
+            shutil.rmtree(directory)
+
+    def test_anonymous_query(self):
+        """ Authenticated users may get the cached sitemap of anonymous users """
+        anonymous = self.sitemap.generate()
+        config.ANONYMOUS_QUERY = True
+        try:
+            self.loginAsPortalOwner()
+            sitemap = self.sitemap
+            sitemap._uncachedgenerate = None
+            self.assertEqual(sitemap.generate(), anonymous)
+            xml = self.uncompress(sitemap())
+            self.assertFalse('<loc>http://nohost/plone/private</loc>' in xml)
+            self.assertTrue('<loc>http://nohost/plone/published</loc>' in xml)
+        finally:
+            config.ANONYMOUS_QUERY = False
+
+    def test_conditional(self):
+        """ Unchanged sitemaps get a 304 without being generated """
+        request = self.portal.REQUEST
+        response = request.response
+        self.assertTrue(self.sitemap())
+        etag = response.getHeader('ETag')
+        self.assertTrue(etag)
+        self.assertTrue(response.getHeader('Last-Modified'))
+
+        request.environ['HTTP_IF_NONE_MATCH'] = etag
+        sitemap = self.sitemap
+        sitemap.generate = None
+        self.assertEqual(sitemap(), '')
+        self.assertEqual(response.getStatus(), 304)
+        self.assertEqual(sitemap.catalog_queries, 0)
+
+        # a change gives a new ETag
+        response.setStatus(200)
+        self.loginAsPortalOwner()
+        self.wftool.doActionFor(self.portal.pending, 'publish')
+        self.logout()
+        xml = self.uncompress(self.sitemap())
+        self.assertEqual(response.getStatus(), 200)
+        self.assertNotEqual(response.getHeader('ETag'), etag)
+        self.assertTrue('<loc>http://nohost/plone/pending</loc>' in xml)
+        del request.environ['HTTP_IF_NONE_MATCH']
+
+    def test_conditional_unlogged(self):
+        """ Sites without logged changes answer 304 without searching the catalog """
+        from zope.annotation.interfaces import IAnnotations
+        from googlesitemap.common import invalidation
+        from googlesitemap.common import sitemap as module
+
+        annotations = IAnnotations(self.portal)
+        if invalidation.ANNOTATION_KEY in annotations:
+            del annotations[invalidation.ANNOTATION_KEY]
+        module._lastchanges.clear()
+        request = self.portal.REQUEST
+        response = request.response
+        self.assertTrue(self.sitemap())
+        lastmodified = response.getHeader('Last-Modified')
+        self.assertTrue(lastmodified)
+
+        request.environ['HTTP_IF_MODIFIED_SINCE'] = lastmodified
+        try:
+            sitemap = self.sitemap
+            self.assertEqual(sitemap(), '')
+            self.assertEqual(response.getStatus(), 304)
+            self.assertEqual(sitemap.catalog_queries, 0)
+        finally:
+            del request.environ['HTTP_IF_MODIFIED_SINCE']
+
+    def test_conditional_disabled(self):
+        """ Authenticated users get no validators """
+        self.loginAsPortalOwner()
+        self.sitemap()
+        self.assertEqual(self.portal.REQUEST.response.getHeader('ETag'), None)
+
+    def test_catalog_queries(self):
+        """ Brains are searched once per view and user """
+        sitemap = self.sitemap
+        sitemap._uncachedgenerate()
+        sitemap._uncachedgenerate()
+        # count and brains
+        self.assertEqual(sitemap.catalog_queries, 2)
+
+        self.loginAsPortalOwner()
+        xml = self.uncompress(sitemap._uncachedgenerate())
+        self.assertEqual(sitemap.catalog_queries, 4)
+        self.assertTrue('<loc>http://nohost/plone/private</loc>' in xml)
+
+    def test_stats(self):
+        """ Generations are timed and counted, cache hits too """
+        from googlesitemap.common.stats import recent
+
+        sitemap = self.sitemap
+        data = sitemap()
+        xml = self.uncompress(data)
+        self.assertEqual(sitemap.stats.cache, 'miss')
+        self.assertEqual(sitemap.stats.counters['entries'], xml.count('<url>'))
+        self.assertEqual(sitemap.stats.counters['bytes_in'], len(xml))
+        self.assertEqual(sitemap.stats.counters['bytes_out'], len(data))
+        self.assertEqual(recent()[0]['name'], 'http://nohost/plone/sitemap.xml')
+        self.assertEqual(recent()[0]['cache'], 'miss')
+
+        sitemap = self.sitemap
+        sitemap.generate()
+        self.assertEqual(sitemap.stats.cache, 'hit')
+        self.assertEqual(sitemap.stats.counters['bytes_out'], 0)
+
+    def test_blocks(self):
+        """ Sitemaps are gzip members of blocks of entries, the ones of blocks
+            not changed are reused
+        """
+        blocksize = config.BLOCKSIZE
+        config.BLOCKSIZE = 1
+        try:
+            data = self.sitemap()
+            config.BLOCKSIZE = 0
+            sitemap = self.sitemap
+            self.assertEqual(self.uncompress(sitemap._uncachedgenerate()),
+                             self.uncompress(data))
+            config.BLOCKSIZE = 1
+
+            self.loginAsPortalOwner()
+            published = self.portal.published
+            published.setModificationDate(DateTime() + 1)
+            published.reindexObject(idxs=['modified'])
+            notify(ObjectModifiedEvent(published))
+            self.logout()
+            sitemap = self.sitemap
+            xml = self.uncompress(sitemap())
+            self.assertTrue(published.modified().HTML4() in xml)
+            self.assertEqual(sitemap.stats.counters['entries'], 1)
+            self.assertEqual(sitemap.stats.counters['blocks_reused'],
+                             len(sitemap._windowbrains()[0]) - 1)
+        finally:
+            config.BLOCKSIZE = blocksize
+
+    def test_blocks_added(self):
+        """ Blocks after a new item are reused """
+        from googlesitemap.common.sitemap import _blocks
+
+        blocksize = config.BLOCKSIZE
+        config.BLOCKSIZE = 4
+        try:
+            self.loginAsPortalOwner()
+            for i in range(30):
+                self.portal.invokeFactory(id='image%d' % (i + 2), type_name='Image')
+            self.logout()
+            self.sitemap()
+
+            self.loginAsPortalOwner()
+            self.portal.invokeFactory(id='newimage', type_name='Image')
+            self.logout()
+            sitemap = self.sitemap
+            xml = self.uncompress(sitemap())
+            self.assertTrue('<loc>http://nohost/plone/newimage/view</loc>' in xml)
+
+            # just the block of the new image is compressed again
+            blocks = list(_blocks(sitemap._slicecatalogbrains(), config.BLOCKSIZE))
+            self.assertTrue(len(blocks) > 2)
+            self.assertEqual(blocks[0][0].getPath(),
+                             '/'.join(self.portal.newimage.getPhysicalPath()))
+            self.assertEqual(sitemap.stats.counters['entries'], len(blocks[0]))
+            self.assertEqual(sitemap.stats.counters['blocks_reused'], len(blocks) - 1)
+        finally:
+            config.BLOCKSIZE = blocksize
+
+    def test_hit_lookups(self):
+        """ Cache hits look up no tools, until something changes """
+        from googlesitemap.common import sitemap as module
+        from googlesitemap.common import invalidation
+
+        data = self.sitemap()
+        getToolByName = module.getToolByName
+        module.getToolByName = invalidation.getToolByName = None
+        try:
+            self.assertEqual(self.sitemap(), data)
+        finally:
+            module.getToolByName = invalidation.getToolByName = getToolByName
+
+        self.loginAsPortalOwner()
+        self.wftool.doActionFor(self.portal.pending, 'publish')
+        self.logout()
+        self.assertTrue('<loc>http://nohost/plone/pending</loc>' in
+                        self.uncompress(self.sitemap()))
+
 
 def test_suite():
     from unittest import defaultTestLoader
@@ -16,7 +16,9 @@
 from gzip import GzipFile
 from StringIO import StringIO
 
+from DateTime import DateTime
 from zope.component import getMultiAdapter
+from zope.publisher.interfaces import NotFound
 from Products.Five.testbrowser import Browser
 from urllib2 import HTTPError
 
@@ -53,12 +55,18 @@ class SiteMapIndexTestCase(FunctionalTestCase):
         #Change maxlen
         from googlesitemap.common import config
         config.MAXLEN = 5
+        self.sort_limit_ratio = config.SORT_LIMIT_RATIO
+        self.maxshards = config.MAXSHARDS
 
         self.loginAsPortalOwner()
 
         self.logout()
         self.browser = Browser()
 
+    def beforeTearDown(self):
+        from googlesitemap.common import config
+        config.SORT_LIMIT_RATIO = self.sort_limit_ratio
+        config.MAXSHARDS = self.maxshards
 
     def uncompress(self, sitemapdata):
         sio = StringIO(sitemapdata)
@@ -82,6 +90,97 @@ class SiteMapIndexTestCase(FunctionalTestCase):
         self.assertTrue('<sitemap' in xml)
         self.assertTrue('<lastmod' in xml)
 
+    def test_catalog_queries(self):
+        """ Shards search only their window, unless all brains are already sorted """
+        from googlesitemap.common import config
+        sitemap = getMultiAdapter((self.portal, self.portal.REQUEST),
+                                  name='sitemapindex.xml.gz')
+        config.SORT_LIMIT_RATIO = 1
+        sitemap.index = 0
+        sitemap._uncachedgenerate()
+        # count and window
+        self.assertEqual(sitemap.catalog_queries, 2)
+
+        # the index needs all brains
+        sitemap.index = None
+        sitemap._uncachedgenerate()
+        self.assertEqual(sitemap.catalog_queries, 3)
+
+        sitemap.index = 1
+        sitemap._uncachedgenerate()
+        self.assertEqual(sitemap.catalog_queries, 3)
+
+    def test_lastchange_unaffected(self):
+        """ Changes not affecting a sitemap don't search the catalog again """
+        from googlesitemap.common import invalidation
+        from googlesitemap.common import sitemap as module
+        # the names seen by the other tests are not ours
+        module._lastchanges.clear()
+        invalidation._generated.clear()
+        lastchange = self.sitemap._lastchange()
+        # an item changing without moving, the index doesn't change
+        invalidation.getChanges(self.portal, create=True).record(10.0, 10.0, False)
+        sitemap = getMultiAdapter((self.portal, self.portal.REQUEST),
+                                  name='sitemapindex.xml.gz')
+        self.assertEqual(sitemap._lastchange(), lastchange)
+        self.assertEqual(sitemap.catalog_queries, 0)
+
+    def test_window(self):
+        """ Windowed searches return the same brains """
+        from googlesitemap.common import config
+        sitemap = getMultiAdapter((self.portal, self.portal.REQUEST),
+                                  name='sitemapindex.xml.gz')
+        sitemap.index = 1
+        config.SORT_LIMIT_RATIO = 1
+        window, count = sitemap._windowbrains()
+        brains = sitemap._catalogbrains()
+        self.assertEqual(count, len(brains))
+        self.assertEqual([brain.getPath() for brain in window],
+                         [brain.getPath() for brain in brains[5:10]])
+
+    def test_index_brains(self):
+        """ The sitemap index loads just the first brain of each shard """
+        from googlesitemap.common.benchmarks.synthetic import LazyBrains
+        brains = LazyBrains(23)
+        self.sitemap._searchbrains = lambda end=None: (brains, len(brains))
+        items = list(self.sitemap.sitemaps())
+        self.assertEqual(brains.accessed, 5)
+        self.assertEqual([item['maxdate'] for item in items],
+                         [DateTime(brains[i].Date).ISO8601() for i in (0, 5, 10, 15, 20)])
+
+    def test_parts(self):
+        """ More than maxshards shards are listed by several index files """
+        from googlesitemap.common import config
+        config.MAXSHARDS = 1
+        self.assertEqual(self.sitemap.indexes(),
+                         ['http://nohost/plone/sitemap.xml',
+                          'http://nohost/plone/sitemap.xml?part=1'])
+        xml = self.uncompress(self.sitemap._uncachedgenerate())
+        self.assertTrue('?index=0' in xml)
+        self.assertTrue('?index=1' not in xml)
+
+        self.sitemap.part = '1'
+        self.assertEqual(self.sitemap.gzipname(), 'index1-sitemap.xml')
+        xml = self.uncompress(self.sitemap._uncachedgenerate())
+        self.assertTrue('?index=0' not in xml)
+        self.assertTrue('?index=1' in xml)
+
+        for part in ('-1', 'last'):
+            self.sitemap.part = part
+            self.assertRaises(NotFound, self.sitemap._sitemapwindow)
+
+    def test_gzipname(self):
+        """ The same shard has the same name however its index is written """
+        self.sitemap.index = '01'
+        self.assertEqual(self.sitemap.gzipname(), '1-sitemap.xml')
+
+    def test_bad_index(self):
+        """ Negative and non numeric shards don't exist """
+        for index in ('-1', 'first'):
+            self.sitemap.index = index
+            self.assertRaises(NotFound, self.sitemap._sitemapwindow)
+            self.assertRaises(NotFound, self.sitemap._stored)
+
     def test_open_fail(self):
         self.loginAsAdmin()
         browser = self.browser
@@ -91,7 +190,7 @@ class SiteMapIndexTestCase(FunctionalTestCase):
         self.loginAsAdmin()
         browser = self.browser
         browser.open('http://nohost/plone/sitemapindex.xml.gz?index=1')
-        xml = self.uncompress(browser.contents)
+        self.assertTrue('<urlset' in self.uncompress(browser.contents))
 
 
     def loginAsAdmin(self):
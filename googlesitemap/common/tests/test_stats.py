@@ -0,0 +1,105 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+import socket
+import time
+import logging
+import unittest
+
+from googlesitemap.common import config
+from googlesitemap.common import stats
+from googlesitemap.common.stats import GenerationStats
+
+
+class GenerationStatsTestCase(unittest.TestCase):
+    """ timings and counters of sitemap requests """
+
+    def slow(self, items, seconds):
+        for item in items:
+            time.sleep(seconds)
+            yield item
+
+    def test_timed(self):
+        """ Nested phases are timed exclusively """
+        generation = GenerationStats()
+        entries = generation.timed('objects', self.slow(range(3), 0.01), 'entries')
+        chunks = generation.timed('render', self.slow(('x' * item for item in entries), 0.02),
+                                  'bytes_in', len)
+        self.assertEqual(list(chunks), ['', 'x', 'xx'])
+        self.assertEqual(generation.counters['entries'], 3)
+        self.assertEqual(generation.counters['bytes_in'], 3)
+        self.assertTrue(0.03 <= generation.timings['objects'] < 0.06)
+        self.assertTrue(0.06 <= generation.timings['render'] < 0.09)
+        self.assertEqual(generation._running, [])
+
+    def test_timed_error(self):
+        def failing():
+            yield 1
+            raise ValueError
+        generation = GenerationStats()
+        self.assertRaises(ValueError, list, generation.timed('render', failing()))
+        self.assertEqual(generation._running, [])
+
+    def test_recent(self):
+        config.STATS_RECENT = 2
+        try:
+            for name in ('first', 'second', 'third'):
+                generation = GenerationStats()
+                generation.name = name
+                stats.record(generation)
+            self.assertEqual([item['name'] for item in stats.recent()], ['third', 'second'])
+        finally:
+            config.STATS_RECENT = 100
+
+    def test_unlogged(self):
+        """ Stats are formatted only if logged """
+        class Unformatted(GenerationStats):
+            def __str__(self):
+                raise AssertionError('formatted')
+        logger = logging.getLogger('googlesitemap.common')
+        level = logger.level
+        logger.setLevel(logging.WARNING)
+        try:
+            for cache in ('hit', 'miss'):
+                generation = Unformatted()
+                generation.cache = cache
+                stats.record(generation)
+        finally:
+            logger.setLevel(level)
+
+    def test_statsd(self):
+        """ Metrics are sent to statsd in a datagram """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.settimeout(5)
+        config.STATSD = '127.0.0.1:%d' % listener.getsockname()[1]
+        try:
+            generation = GenerationStats()
+            generation.name = 'sitemap.xml'
+            generation.cache = 'miss'
+            generation.incr('entries', 7)
+            stats.record(generation)
+            lines = listener.recv(65536).split('\n')
+        finally:
+            config.STATSD = None
+            listener.close()
+        self.assertTrue('googlesitemap.entries:7|c' in lines)
+        self.assertTrue('googlesitemap.cache.miss:1|c' in lines)
+        self.assertTrue('googlesitemap.compress:0|ms' in lines)
+        self.assertTrue([line for line in lines if line.startswith('googlesitemap.total:')])
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
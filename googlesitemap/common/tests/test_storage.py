@@ -0,0 +1,87 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from googlesitemap.common.storage import SitemapStore
+
+
+class SitemapStoreTestCase(unittest.TestCase):
+    """ sitemaps stored on the filesystem """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = SitemapStore(os.path.join(self.directory, 'plone'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write(self):
+        self.store.write('0-sitemap.xml', ['gzip', 'data'], 3, (10.0, 5.0))
+        self.assertEqual(open(self.store.path('0-sitemap.xml')).read(), 'gzipdata')
+        self.assertEqual(self.store.manifest(),
+                         {'0-sitemap.xml': {'serial': 3, 'window': [10.0, 5.0]}})
+
+    def test_write_failure(self):
+        """ Failures don't leave partial files around """
+        def chunks():
+            yield 'gzip'
+            raise ValueError
+        self.store.write('sitemap.xml', ['old'], 1, None)
+        self.assertRaises(ValueError, self.store.write, 'sitemap.xml', chunks(), 2, None)
+        self.assertEqual(open(self.store.path('sitemap.xml')).read(), 'old')
+        self.assertEqual(sorted(os.listdir(self.store.directory)),
+                         ['manifest.json', 'manifest.lock', 'sitemap.xml.gz'])
+
+    def test_update(self):
+        """ Sitemaps written by other processes are recorded at once """
+        self.store.writefile('0-sitemap.xml', ['zero'])
+        self.store.writefile('1-sitemap.xml', ['one'])
+        self.assertEqual(self.store.manifest(), {})
+        self.store.update({'0-sitemap.xml': (3, [10.0, 5.0]), '1-sitemap.xml': (3, [5.0, 1.0])})
+        self.assertEqual(sorted(self.store.manifest().keys()), ['0-sitemap.xml', '1-sitemap.xml'])
+        self.assertEqual(open(self.store.path('1-sitemap.xml')).read(), 'one')
+
+    def test_concurrent_updates(self):
+        """ Sitemaps recorded at the same time are all in the manifest """
+        def update(first):
+            for i in range(first, first + 20):
+                self.store.update({'%d-sitemap.xml' % i: (1, [1.0, 0.0])})
+        threads = [threading.Thread(target=update, args=(first,)) for first in (0, 20, 40, 60)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.store.manifest()), 80)
+
+    def test_state(self):
+        self.assertEqual(self.store.state(), {})
+        self.store.setstate({'counter': 3, 'complete': True})
+        self.assertEqual(self.store.state(), {'counter': 3, 'complete': True})
+
+    def test_remove(self):
+        self.store.write('1-sitemap.xml', ['data'], 1, [float('inf'), float('-inf')])
+        self.store.remove('1-sitemap.xml')
+        self.assertFalse(os.path.exists(self.store.path('1-sitemap.xml')))
+        self.assertEqual(self.store.manifest(), {})
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
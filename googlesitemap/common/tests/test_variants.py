@@ -0,0 +1,58 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+import unittest
+
+from googlesitemap.common.sitemap import SiteMapCommonView
+from googlesitemap.common.variants import URLVariants
+
+
+class Request(dict):
+    pass
+
+
+class NewsSiteMapView(SiteMapCommonView):
+    urlvariants = {'News Item': URLVariants(changefreq='daily', priority='0.8'),
+                   'Image': SiteMapCommonView.defaultvariants}
+
+
+class URLVariantsTestCase(unittest.TestCase):
+    """ sitemap entries by portal_type """
+
+    def test_default(self):
+        self.assertEqual(list(URLVariants()(None, 'http://nohost/plone/doc', 'now')),
+                         [{'loc': 'http://nohost/plone/doc', 'lastmod': 'now'}])
+
+    def test_suffixes(self):
+        variants = URLVariants(('/view', ''), changefreq='weekly', priority=0.5)
+        self.assertEqual(variants(None, 'http://nohost/plone/file', 'now'),
+                         [{'loc': 'http://nohost/plone/file/view', 'lastmod': 'now',
+                           'changefreq': 'weekly', 'priority': 0.5},
+                          {'loc': 'http://nohost/plone/file', 'lastmod': 'now',
+                           'changefreq': 'weekly', 'priority': 0.5}])
+
+    def test_subclass(self):
+        """ Subclasses extend the mapping of their bases """
+        variants = NewsSiteMapView(None, Request())._urlvariants()
+        self.assertEqual(sorted(variants.keys()), ['File', 'Image', 'News Item'])
+        self.assertTrue(variants['File'] is SiteMapCommonView.urlvariants['File'])
+        self.assertTrue(variants['Image'] is SiteMapCommonView.defaultvariants)
+        self.assertEqual(variants['News Item'](None, 'http://nohost/plone/news', 'now'),
+                         [{'loc': 'http://nohost/plone/news', 'lastmod': 'now',
+                           'changefreq': 'daily', 'priority': '0.8'}])
+
+
+def test_suite():
+    from unittest import defaultTestLoader
+    return defaultTestLoader.loadTestsFromName(__name__)
@@ -0,0 +1,64 @@
+# Authors: Davide Moro <davide.moro@redomino.com> and contributors (see docs/CONTRIBUTORS.txt)
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as published
+# by the Free Software Foundation.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA
+# 02111-1307, USA.
+""" Sitemap entries of catalog items, by portal_type.
+
+Sitemap views map portal types to the callables producing the entries of
+their items (urlvariants): files are listed with their /view page too,
+images just with it, other types with their url (defaultvariants).
+Subclasses list only the types they add or change, the mappings of the base
+classes are merged once per request::
+
+    class NewsSiteMapView(SiteMapCommonView):
+        urlvariants = {'News Item': URLVariants(changefreq='daily', priority='0.8')}
+
+A producer is called with the brain, its url and its lastmod and returns the
+list of entries (dictionaries with loc, lastmod and optionally changefreq and
+priority) for it.
+"""
+
+
+class URLVariants(object):
+    """ The url of the item followed by each suffix ('' for the url itself),
+        all with the same lastmod, changefreq and priority
+    """
+
+    def __init__(self, suffixes=('',), changefreq=None, priority=None):
+        self.suffixes = tuple(suffixes)
+        self.extra = {}
+        if changefreq:
+            self.extra['changefreq'] = changefreq
+        if priority:
+            self.extra['priority'] = priority
+        # just the url, as for most items
+        self.plain = self.suffixes == ('',) and not self.extra
+
+    def __call__(self, item, url, lastmod):
+        if self.plain:
+            return ({'loc': url, 'lastmod': lastmod},)
+        entries = []
+        for suffix in self.suffixes:
+            entry = {'loc': url + suffix, 'lastmod': lastmod}
+            entry.update(self.extra)
+            entries.append(entry)
+        return entries
+
+
+# entries of the items whose type isn't mapped
+DEFAULT = URLVariants()
+
+# images are listed with their view only: use a sitemap for images
+URLVARIANTS = {'Image': URLVariants(('/view',)),
+               'File': URLVariants(('/view', '')),
+              }
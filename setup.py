@@ -46,6 +46,10 @@ setup(name='googlesitemap.common',
       entry_points="""
       # -*- Entry points: -*-
 
+      [console_scripts]
+      sitemap-regenerate = googlesitemap.common.regenerate:main
+      sitemap-regenerate-all = googlesitemap.common.batch:main
+
       [z3c.autoinclude.plugin]
       target = plone
       """,